@@ -0,0 +1,265 @@
+import asyncio
+import os
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+from urllib.parse import urlparse
+
+import httpx
+
+from CrawlFrontier import CrawlFrontier
+from CrawlScheduler import CrawlScheduler
+from DuplicateDetector import DuplicateDetector
+from BrowserPool import (BrowserPool, ScreenshotQueue, DEFAULT_BLOCKED_RESOURCE_TYPES,
+                         DEFAULT_BLOCKED_URL_PATTERNS)
+from IncrementalCrawlIndex import IncrementalCrawlIndex
+from SitemapSeeder import SitemapSeeder
+from UrlCanonicalizer import canonical_netloc
+
+
+class AsyncCrawler:
+    """Frontier-driven asyncio crawl engine with a global and a per-host concurrency limit.
+
+    Writes the same layout as RecursiveWebScraper: scraped_pages/<safe_filename>.html
+    and images/<name>.png below the location path.
+    """
+
+    def __init__(self, scraper, max_concurrency: int = 10, per_host_concurrency: int = 4,
+                 screenshot_concurrency: int = 2, with_screenshots: bool = True,
+                 frontier: CrawlFrontier = None, incremental_index: IncrementalCrawlIndex = None,
+                 viewport: Tuple[int, int] = (1280, 800), full_page: bool = True, max_screenshot_height: int = 10000,
+                 render: bool = False, blocked_resource_types=DEFAULT_BLOCKED_RESOURCE_TYPES,
+                 blocked_url_patterns=DEFAULT_BLOCKED_URL_PATTERNS, robots: SitemapSeeder = None,
+                 on_page: Optional[Callable[[str, bool], None]] = None, scheduler: CrawlScheduler = None):
+        self.scraper = scraper
+        self.max_concurrency = max(1, max_concurrency)
+        self.per_host_concurrency = max(1, per_host_concurrency)
+        self.screenshot_concurrency = max(1, screenshot_concurrency)
+        self.timeout = httpx.Timeout(scraper.read_timeout, connect=scraper.connect_timeout)
+        self.rate_limiter = scraper.rate_limiter
+        self.with_screenshots = with_screenshots
+        self.screenshot_options = {"viewport": viewport, "full_page": full_page, "max_height": max_screenshot_height}
+        # Rendered mode: one browser navigation yields the DOM snapshot, the links and the screenshot
+        self.render = render
+        self.blocked_resource_types = blocked_resource_types
+        self.blocked_url_patterns = blocked_url_patterns
+        self.renderer = None
+        self.frontier = frontier if frontier is not None else CrawlFrontier()
+        self.incremental_index = incremental_index
+        # robots.txt rules (and sitemap lastmod dates via the frontier) from a SitemapSeeder
+        self.robots = robots
+        # Called as on_page(url, changed) once a page is stored and its screenshot taken (streaming pipeline)
+        self.on_page = on_page
+        self.scheduler = scheduler if scheduler is not None else CrawlScheduler()
+        self.duplicates = DuplicateDetector(scraper.duplicate_distance)
+        self.max_retries = 5
+
+    def crawl(self, start_url: str, locationPath) -> Dict[str, int]:
+        """Crawl until the frontier is empty or the budget is used up. Returns the frontier's status counts."""
+        return asyncio.run(self._crawl(start_url, Path(locationPath)))
+
+    async def _crawl(self, start_url: str, location_path: Path) -> Dict[str, int]:
+        base_domain = canonical_netloc(start_url)
+        host_limits: Dict[str, asyncio.Semaphore] = {}
+        if self.render:
+            pool = BrowserPool(size=self.screenshot_concurrency, blocked_resource_types=self.blocked_resource_types,
+                               blocked_url_patterns=self.blocked_url_patterns, **self.screenshot_options)
+            try:
+                self.renderer = await pool.start()
+            except Exception:
+                await pool.close()
+                raise
+            screenshots = None
+        else:
+            screenshots = await self._start_screenshots()
+        if self.allowed(start_url):
+            self.frontier.add(start_url, 0, priority=float("-inf"))
+        else:
+            print(f"⚠️ robots.txt disallows the start URL {start_url}")
+        for url, fingerprint in self.frontier.fingerprints():
+            self.duplicates.add(url, fingerprint)
+        # A resumed frontier already spent part of the budget
+        self.scheduler.start(self.frontier)
+
+        limits = httpx.Limits(max_connections=self.max_concurrency,
+                              max_keepalive_connections=self.max_concurrency)
+        async with httpx.AsyncClient(follow_redirects=True, timeout=self.timeout, limits=limits) as client:
+            async def handle(url: str, depth: int):
+                try:
+                    host = urlparse(url).netloc
+                    host_limit = host_limits.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+                    async with host_limit:
+                        links, original, fingerprint = await self._process(
+                            client, url, depth, base_domain, location_path, screenshots)
+                    if original is not None:
+                        self.frontier.record_alias(url, original)
+                        print(f"⏩ Near-duplicate of {original}: {url}")
+                        return
+                    self.frontier.add_fingerprint(url, fingerprint)
+                    links = {link: priority for link, priority in links.items() if self.allowed(link)}
+                    self.frontier.add_many(links, depth + 1, priorities=links)
+                    self.frontier.mark_done(url)
+                except Exception as e:
+                    self.frontier.mark_failed(url, str(e))
+                    print(f"Failed to fetch {url}: {e}")
+
+            in_flight = set()
+            while True:
+                free = self.max_concurrency - len(in_flight)
+                remaining = self.scheduler.remaining()
+                if remaining is not None:
+                    free = min(free, remaining)
+                claimed = self.frontier.next_batch(free) if free > 0 else []
+                for url, depth in claimed:
+                    if self.scheduler.reserve(url):
+                        in_flight.add(asyncio.create_task(handle(url, depth)))
+                    elif self.scheduler.exhausted():
+                        # Left pending, a resumed run with a larger budget picks it up
+                        self.frontier.release(url)
+                    else:
+                        reason = self.scheduler.refusal(url)
+                        self.frontier.mark_skipped(url, reason)
+                        print(f"⏩ Skipping {url}: {reason}")
+                if not in_flight:
+                    if claimed:
+                        continue
+                    break
+                _, in_flight = await asyncio.wait(in_flight, return_when=asyncio.FIRST_COMPLETED)
+        if self.scheduler.exhausted():
+            print(f"⏹️ Crawl budget used up after {self.scheduler.pages} pages: {self.frontier.stats()}")
+        if screenshots is not None:
+            await screenshots.join()
+            await screenshots.pool.close()
+        if self.renderer is not None:
+            await self.renderer.close()
+            self.renderer = None
+        return self.frontier.stats()
+
+    async def _start_screenshots(self):
+        if not self.with_screenshots:
+            return None
+        pool = BrowserPool(size=self.screenshot_concurrency, **self.screenshot_options)
+        try:
+            await pool.start()
+        except Exception as e:
+            print(f"❌ Could not start the screenshot browser, continuing without screenshots: {e}")
+            await pool.close()
+            return None
+        return ScreenshotQueue(pool).start()
+
+    def allowed(self, url: str) -> bool:
+        return self.robots is None or self.robots.can_fetch(url)
+
+    async def _process(self, client: httpx.AsyncClient, url: str, depth: int, base_domain: str,
+                       location_path: Path, screenshots: ScreenshotQueue):
+        """Returns ({link: priority}, url of the page this one duplicates or None, SimHash fingerprint)."""
+        filename = os.path.join(location_path / "scraped_pages", f"{self.scraper.safe_filename(url)}.html")
+        if self.renderer is not None:
+            return await self._process_rendered(url, depth, base_domain, location_path, filename)
+        base_url = url
+        if self.incremental_index is not None:
+            html, changed, base_url = await self._fetch_incremental(client, url, filename)
+        elif self.scraper.has_stored_page(url, filename):
+            # Page was stored by an earlier (possibly interrupted) run: reuse it for link discovery.
+            html, changed = None, False
+        else:
+            response = await self.fetch(client, url)
+            html, changed, base_url = response.text, True, str(response.url)
+        links, original, fingerprint = await asyncio.to_thread(
+            self._analyse, html, url, depth, base_domain, filename, changed, base_url)
+        if changed and original is None and screenshots is not None:
+            await screenshots.put(url, location_path / "images", lambda path: self._notify(url, changed))
+        elif original is None:
+            await self._notify(url, changed)
+        return links, original, fingerprint
+
+    async def _process_rendered(self, url: str, depth: int, base_domain: str, location_path: Path, filename: str):
+        await self.rate_limiter.acquire_async(urlparse(url).netloc)
+        screenshot_dir = location_path / "images" if self.with_screenshots else None
+        result = await self.renderer.render(url, screenshot_dir)
+        html, changed = result["html"], True
+        if self.incremental_index is not None:
+            content_hash = IncrementalCrawlIndex.content_hash(html)
+            changed = (not self.scraper.has_stored_page(url, filename)
+                       or content_hash != self.incremental_index.get_hash(url))
+            self.incremental_index.record(url, None, None, content_hash, changed=changed)
+        links, original, fingerprint = await asyncio.to_thread(
+            self._analyse, html, url, depth, base_domain, filename, changed, result["url"])
+        if original is not None and result["screenshot"] and os.path.exists(result["screenshot"]):
+            os.remove(result["screenshot"])
+        elif original is None:
+            await self._notify(url, changed)
+        return links, original, fingerprint
+
+    async def _notify(self, url: str, changed: bool) -> None:
+        if self.on_page is not None:
+            # Runs in a thread: a full downstream queue slows the crawl down instead of blocking the loop
+            await asyncio.to_thread(self.on_page, url, changed)
+
+    async def _fetch_incremental(self, client: httpx.AsyncClient, url: str, filename: str):
+        """Conditional GET. Returns (html, changed, response URL); html is None when the stored
+        copy is still current."""
+        have_copy = self.scraper.has_stored_page(url, filename)
+        if have_copy and self._unchanged_since_last_check(url):
+            self.incremental_index.record(url, None, None, None, changed=False)
+            print(f"⏩ Unchanged according to sitemap: {url}")
+            return None, False, url
+        headers = self.incremental_index.conditional_headers(url) if have_copy else {}
+        response = await self.fetch(client, url, headers=headers)
+        final_url = str(response.url)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 304:
+            self.incremental_index.record(url, etag, last_modified, None, changed=False)
+            print(f"⏩ Not modified: {url}")
+            return None, False, final_url
+        html = response.text
+        content_hash = IncrementalCrawlIndex.content_hash(html)
+        changed = not have_copy or content_hash != self.incremental_index.get_hash(url)
+        self.incremental_index.record(url, etag, last_modified, content_hash, changed=changed)
+        if not changed:
+            print(f"⏩ Unchanged content: {url}")
+        return html, changed, final_url
+
+    def _unchanged_since_last_check(self, url: str) -> bool:
+        """True if the sitemap's <lastmod> for ``url`` predates our last check of it."""
+        lastmod = self.frontier.lastmod(url)
+        checked = self.incremental_index.last_checked(url)
+        if not lastmod or checked is None:
+            return False
+        try:
+            modified = datetime.fromisoformat(lastmod.replace("Z", "+00:00"))
+        except ValueError:
+            return False
+        if modified.tzinfo is None:
+            modified = modified.replace(tzinfo=timezone.utc)
+        return modified.timestamp() <= checked
+
+    def _analyse(self, html, url: str, depth: int, base_domain: str, filename: str, store: bool,
+                 base_url: str = None):
+        """Parse once, drop near-duplicates and store new content. ``html=None`` reads the stored copy.
+        Links are resolved against ``base_url``, the URL the page was served from."""
+        if html is None:
+            html = self.scraper.load_stored_page(url, filename)
+        page = self.scraper.parse_page(html, url, base_url)
+        original, fingerprint = self.duplicates.check(url, page.text)
+        if original is not None and original != url:
+            return {}, original, fingerprint
+        if store:
+            self.scraper.store_page(url, html, filename, page.title)
+            page.page_info()
+        return self.scheduler.rank(page.links(base_domain), depth + 1, page), None, fingerprint
+
+    async def fetch(self, client: httpx.AsyncClient, url: str, headers: dict = None) -> httpx.Response:
+        host = urlparse(url).netloc
+        for attempt in range(self.max_retries):
+            await self.rate_limiter.acquire_async(host)
+            response = await client.get(url, headers=headers)
+            delay = self.rate_limiter.on_response(host, response.status_code, response.headers.get("Retry-After"))
+            if delay:
+                print(f"{response.status_code} for {url}, backing off {delay:.1f}s before retry ({attempt+1}/{self.max_retries})...")
+                continue
+            if response.status_code != 304:
+                response.raise_for_status()
+            return response
+        raise Exception(f"Failed to fetch {url} after {self.max_retries} attempts due to rate limiting.")
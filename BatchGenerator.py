@@ -0,0 +1,159 @@
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from Pipeline import test_path
+from TestUtils import extract_test_code
+
+
+class BatchGenerator:
+    """Generates tests for many combined-requirement files with one Batch API job.
+
+    Batch jobs are cheaper and have higher throughput limits than interactive calls, but results
+    may take up to ``completion_window``. The requests are written to ``<work_dir>/batch_input.jsonl``
+    and the job id to ``<work_dir>/batch_state.json``, so an interrupted run can pick the job up
+    again with ``resume()``. The connector must offer ``client``, ``model``, ``build_messages`` and
+    ``cache_key``; give it a ``base_url`` to run against a local stand-in.
+    """
+
+    TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(self, connector, work_dir, completion_window: str = "24h", poll_interval: float = 30.0,
+                 max_poll_interval: float = 300.0, timeout: Optional[float] = None):
+        self.connector = connector
+        self.work_dir = Path(work_dir)
+        self.work_dir.mkdir(parents=True, exist_ok=True)
+        self.completion_window = completion_window
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.timeout = timeout
+        self.state_path = self.work_dir / "batch_state.json"
+
+    def write_batch_file(self, files: List[str]) -> Path:
+        path = self.work_dir / "batch_input.jsonl"
+        with open(path, "w", encoding="utf-8") as out:
+            for file_path in files:
+                request = {
+                    "custom_id": os.path.basename(str(file_path)),
+                    "method": "POST",
+                    "url": self.ENDPOINT,
+                    "body": {"model": self.connector.model, "messages": self.connector.build_messages(file_path)},
+                }
+                out.write(json.dumps(request, ensure_ascii=False) + "\n")
+        return path
+
+    def submit(self, files: List[str]) -> Optional[str]:
+        """Upload the requests and start the batch job. Returns its id (None if nothing had to be sent)."""
+        if not files:
+            return None
+        if self.state_path.exists():
+            raise RuntimeError(f"Batch in {self.state_path} is not finished yet; collect it with resume() first.")
+        batch_file = self.write_batch_file(files)
+        client = self.connector.client
+        with open(batch_file, "rb") as f:
+            uploaded = client.files.create(file=f, purpose="batch")
+        batch = client.batches.create(input_file_id=uploaded.id, endpoint=self.ENDPOINT,
+                                      completion_window=self.completion_window)
+        files_by_id = {os.path.basename(str(p)): str(p) for p in files}
+        with open(self.state_path, "w", encoding="utf-8") as f:
+            json.dump({"batch_id": batch.id, "files": files_by_id}, f, indent=2)
+        print(f"📤 Batch {batch.id} submitted with {len(files)} requests.")
+        return batch.id
+
+    def wait(self, batch_id: str):
+        """Poll the job with a growing interval until it reaches a terminal status."""
+        client = self.connector.client
+        deadline = time.monotonic() + self.timeout if self.timeout is not None else None
+        delay = self.poll_interval
+        while True:
+            batch = client.batches.retrieve(batch_id)
+            counts = getattr(batch, "request_counts", None)
+            progress = f" ({counts.completed}/{counts.total})" if counts is not None else ""
+            print(f"⏳ Batch {batch_id}: {batch.status}{progress}")
+            if batch.status in self.TERMINAL_STATUSES:
+                return batch
+            if deadline is not None and time.monotonic() + delay > deadline:
+                raise TimeoutError(f"Batch {batch_id} not finished after {self.timeout:.0f}s; continue with resume().")
+            time.sleep(delay)
+            delay = min(delay * 1.5, self.max_poll_interval)
+
+    def collect(self, batch, files_by_id: Dict[str, str], tests_dir) -> List[Path]:
+        """Write one test file per successful request and cache the answers."""
+        os.makedirs(tests_dir, exist_ok=True)
+        client = self.connector.client
+        cache = getattr(self.connector, "cache", None)
+        written = []
+        if batch.output_file_id:
+            for line in client.files.content(batch.output_file_id).text.splitlines():
+                if not line.strip():
+                    continue
+                result = json.loads(line)
+                custom_id = result["custom_id"]
+                response = result.get("response") or {}
+                if result.get("error") or response.get("status_code", 200) >= 400:
+                    print(f"❌ Batch request {custom_id} failed: {result.get('error') or response.get('body')}")
+                    continue
+                answer = response["body"]["choices"][0]["message"]["content"] or ""
+                if not answer.strip():
+                    print(f"⚠️ No response received for file {custom_id}.")
+                    continue
+                source = files_by_id.get(custom_id)
+                if cache is not None and source is not None and os.path.exists(source):
+                    cache.put(self.connector.cache_key(source), self.connector.model, answer.strip())
+                test_output_file = test_path(tests_dir, custom_id)
+                with open(test_output_file, "w", encoding="utf-8") as f:
+                    f.write(extract_test_code(answer))
+                print(f"💾 Test saved in: {test_output_file}")
+                written.append(test_output_file)
+        if batch.error_file_id:
+            for line in client.files.content(batch.error_file_id).text.splitlines():
+                if line.strip():
+                    result = json.loads(line)
+                    print(f"❌ Batch request {result.get('custom_id')} failed: {result.get('error') or result.get('response')}")
+        if batch.status != "completed":
+            print(f"⚠️ Batch {batch.id} ended with status {batch.status}.")
+        return written
+
+    def run(self, files: List[str], tests_dir) -> List[Path]:
+        """Generate tests for ``files``; answers already in the response cache are used directly.
+
+        An unfinished job from an interrupted run (``batch_state.json``) is collected first, and
+        files it answered are not sent again.
+        """
+        files = [str(f) for f in files]
+        os.makedirs(tests_dir, exist_ok=True)
+        resumed = []
+        if self.state_path.exists():
+            print("🔁 Unfinished batch found, collecting it before submitting new requests.")
+            resumed = self.resume(tests_dir)
+            answered = {str(p) for p in resumed}
+            files = [f for f in files if str(test_path(tests_dir, f)) not in answered]
+        written, remaining = [], []
+        cache = getattr(self.connector, "cache", None)
+        for file_path in files:
+            cached = cache.get(self.connector.cache_key(file_path)) if cache is not None else None
+            if cached is None:
+                remaining.append(file_path)
+                continue
+            test_output_file = test_path(tests_dir, file_path)
+            with open(test_output_file, "w", encoding="utf-8") as f:
+                f.write(extract_test_code(cached))
+            written.append(test_output_file)
+        if written:
+            print(f"♻️ {len(written)} tests written from cached answers.")
+        batch_id = self.submit(remaining)
+        if batch_id is None:
+            return resumed + written
+        return resumed + written + self.resume(tests_dir)
+
+    def resume(self, tests_dir) -> List[Path]:
+        """Wait for the job recorded in ``batch_state.json`` and write its results."""
+        with open(self.state_path, "r", encoding="utf-8") as f:
+            state = json.load(f)
+        batch = self.wait(state["batch_id"])
+        written = self.collect(batch, state["files"], tests_dir)
+        os.remove(self.state_path)
+        return written
@@ -0,0 +1,153 @@
+import asyncio
+import os
+import re
+from typing import Iterable, Optional, Tuple
+
+from playwright.async_api import async_playwright
+
+from GeneratePagePictures import screenshot_filename
+
+# Defaults for rendered crawls: nothing the DOM snapshot or the screenshot depends on
+DEFAULT_BLOCKED_RESOURCE_TYPES = ("font", "media")
+DEFAULT_BLOCKED_URL_PATTERNS = (
+    r"google-analytics\.com", r"googletagmanager\.com", r"doubleclick\.net", r"connect\.facebook\.net",
+    r"hotjar\.com", r"segment\.(io|com)", r"matomo", r"piwik",
+)
+
+
+class BrowserPool:
+    """One long-lived Chromium with ``size`` reusable pages, each in its own browser context."""
+
+    def __init__(self, size: int = 4, viewport: Tuple[int, int] = (1280, 800), full_page: bool = True,
+                 max_height: int = 10000, timeout: int = 15000, headless: bool = True,
+                 blocked_resource_types: Iterable[str] = (), blocked_url_patterns: Iterable[str] = (),
+                 wait_until: str = "load"):
+        self.size = max(1, size)
+        self.blocked_resource_types = set(blocked_resource_types)
+        self.blocked_url = re.compile("|".join(blocked_url_patterns)) if blocked_url_patterns else None
+        self.wait_until = wait_until
+        self.viewport = {"width": viewport[0], "height": viewport[1]}
+        self.full_page = full_page
+        self.max_height = max_height
+        self.timeout = timeout
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self._contexts = []
+        self._pages: Optional[asyncio.Queue] = None
+
+    async def start(self):
+        self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(headless=self.headless)
+        self._pages = asyncio.Queue()
+        for _ in range(self.size):
+            context = await self.browser.new_context(viewport=self.viewport)
+            if self.blocked_resource_types or self.blocked_url:
+                await context.route("**/*", self._route)
+            self._contexts.append(context)
+            self._pages.put_nowait(await context.new_page())
+        return self
+
+    async def _route(self, route):
+        request = route.request
+        if request.resource_type in self.blocked_resource_types or (
+                self.blocked_url is not None and self.blocked_url.search(request.url)):
+            await route.abort()
+        else:
+            await route.continue_()
+
+    async def close(self):
+        for context in self._contexts:
+            await context.close()
+        self._contexts = []
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def screenshot(self, url: str, output_dir) -> str:
+        os.makedirs(output_dir, exist_ok=True)
+        path = os.path.join(output_dir, screenshot_filename(url))
+        page = await self._pages.get()
+        try:
+            await page.goto(url, timeout=self.timeout)
+            await self.capture(page, path)
+        finally:
+            self._pages.put_nowait(page)
+        print(f"✅ Saved screenshot: {path}")
+        return path
+
+    async def render(self, url: str, screenshot_dir=None) -> dict:
+        """Load ``url`` once and return the post-JavaScript DOM, plus a screenshot of the same load."""
+        page = await self._pages.get()
+        try:
+            response = await page.goto(url, timeout=self.timeout, wait_until=self.wait_until)
+            status = response.status if response is not None else None
+            if status is not None and status >= 400:
+                raise Exception(f"HTTP {status} for {url}")
+            html = await page.content()
+            path = None
+            if screenshot_dir is not None:
+                os.makedirs(screenshot_dir, exist_ok=True)
+                path = os.path.join(screenshot_dir, screenshot_filename(url))
+                await self.capture(page, path)
+            return {"url": page.url, "status": status, "html": html, "screenshot": path}
+        finally:
+            self._pages.put_nowait(page)
+
+    async def capture(self, page, path: str) -> None:
+        """Screenshot the current page; full-page shots are cut off at ``max_height`` pixels."""
+        if not self.full_page:
+            await page.screenshot(path=path)
+            return
+        height = await page.evaluate("() => document.documentElement.scrollHeight")
+        if height > self.max_height:
+            clip = {"x": 0, "y": 0, "width": self.viewport["width"], "height": self.max_height}
+            await page.screenshot(path=path, full_page=True, clip=clip)
+        else:
+            await page.screenshot(path=path, full_page=True)
+
+
+class ScreenshotQueue:
+    """Bounded queue of screenshot jobs processed by the pool while the crawl keeps running."""
+
+    def __init__(self, pool: BrowserPool, maxsize: int = 0):
+        self.pool = pool
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize or pool.size * 4)
+        self._workers = []
+
+    def start(self):
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.pool.size)]
+        return self
+
+    async def put(self, url: str, output_dir, on_done=None) -> None:
+        """``on_done(path)`` is awaited once the screenshot is saved (``path`` is None if it failed)."""
+        await self.queue.put((url, output_dir, on_done))
+
+    async def _worker(self):
+        while True:
+            url, output_dir, on_done = await self.queue.get()
+            path = None
+            try:
+                path = await self.pool.screenshot(url, output_dir)
+            except Exception as e:
+                print(f"❌ Failed to load {url}: {e}")
+            try:
+                if on_done is not None:
+                    await on_done(path)
+            except Exception as e:
+                print(f"❌ Screenshot callback failed for {url}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def join(self):
+        await self.queue.join()
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
@@ -0,0 +1,156 @@
+import ast
+import glob
+import os
+import re
+from pathlib import Path
+from typing import List
+
+from HtmlReducer import count_tokens
+from PromptTemplates import test_generation_prefix
+from TestUtils import RequirementCombiner, extract_test_code
+
+REQUIREMENT_ITEM = re.compile(r"\n(?=\s*(?:\d+[.)]|[-*•])\s)")
+CHUNK_NOTE = ("This is only part {part} of {parts} of the page. Write tests only for the requirements that can be "
+              "checked with the elements of this part; if none apply, answer with an empty Python module.")
+
+
+def split_text(text: str, max_tokens: int, items: re.Pattern = None) -> List[str]:
+    """Split ``text`` into pieces of at most ``max_tokens``, at item boundaries (``items``) or lines.
+    Single lines that are too long are cut."""
+    pieces = items.split(text) if items is not None else text.split("\n")
+    chunks, current, used = [], [], 0
+    for piece in pieces:
+        cost = count_tokens(piece) + 1
+        if cost > max_tokens:
+            # e.g. minified HTML on a single line: about four characters per token
+            width = max(1, max_tokens * 4)
+            parts = [piece[i:i + width] for i in range(0, len(piece), width)]
+        else:
+            parts = [piece]
+        for part in parts:
+            cost = count_tokens(part) + 1
+            if current and used + cost > max_tokens:
+                chunks.append("\n".join(current))
+                current, used = [], 0
+            current.append(part)
+            used += cost
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def _segment(lines: List[str], node: ast.stmt) -> str:
+    start = min([node.lineno] + [d.lineno for d in getattr(node, "decorator_list", [])])
+    return "\n".join(lines[start - 1:node.end_lineno])
+
+
+def merge_test_modules(modules: List[str]) -> str:
+    """Merge generated test modules into one: imports and helpers once, tests de-duplicated by
+    name; tests with the same name but different code are renamed."""
+    header, imports, helpers, tests = [], [], [], []
+    seen_source, names = set(), {}
+    for module in modules:
+        try:
+            tree = ast.parse(module)
+        except SyntaxError as e:
+            print(f"⚠️ Skipping a chunk with invalid Python: {e}")
+            continue
+        lines = module.splitlines()
+        for line in lines:
+            if not line.startswith("#"):
+                break
+            if line not in header:
+                header.append(line)
+        for node in tree.body:
+            source = _segment(lines, node)
+            if source in seen_source:
+                continue
+            seen_source.add(source)
+            if isinstance(node, (ast.Import, ast.ImportFrom)):
+                imports.append(source)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                count = names.get(node.name, 0) + 1
+                names[node.name] = count
+                if count > 1:
+                    # Same name, different body: keep both, pytest would only see the last one
+                    keyword = "class " if isinstance(node, ast.ClassDef) else "def "
+                    source = source.replace(keyword + node.name, f"{keyword}{node.name}_{count}", 1)
+                (tests if node.name.startswith(("test", "Test")) else helpers).append(source)
+            else:
+                helpers.append(source)
+    return "\n\n\n".join(part for part in ("\n".join(header), "\n".join(imports), *helpers, *tests) if part) + "\n"
+
+
+class ChunkedGenerator:
+    """Map-reduce test generation for combined files that are too large for one prompt.
+
+    Prompts (shared prefix plus combined file) within ``max_tokens`` go to the connector unchanged.
+    Larger ones are split into token-bounded parts of the page and the requirement list. Each part
+    is written as a combined file of its own under ``<combined dir>/chunks/``. Every part is sent,
+    ``parallel_parts`` at a time with ``ask_many``. The answers are merged into one de-duplicated test module.
+    """
+
+    def __init__(self, connector, max_tokens: int = 8000, parallel_parts: int = 16):
+        self.connector = connector
+        self.max_tokens = max_tokens
+        self.parallel_parts = max(1, parallel_parts)
+
+    def _oversized(self, file_path: str):
+        """Sections of the combined file if its prompt exceeds ``max_tokens``, else None."""
+        with open(file_path, "r", encoding="utf-8") as f:
+            combined = f.read()
+        if count_tokens(test_generation_prefix() + combined) <= self.max_tokens:
+            return None
+        return RequirementCombiner.split(combined)
+
+    def needs_chunks(self, file_path: str) -> bool:
+        return self._oversized(file_path) is not None
+
+    def ask_with_file(self, file_path: str) -> str:
+        sections = self._oversized(file_path)
+        if sections is None:
+            return self.connector.ask_with_file(file_path)
+
+        chunk_files = self.write_chunks(file_path, sections)
+        print(f"🧩 {os.path.basename(file_path)} split into {len(chunk_files)} parts.")
+        answers = []
+        for start in range(0, len(chunk_files), self.parallel_parts):
+            answers.extend(self.connector.ask_many(chunk_files[start:start + self.parallel_parts]))
+        failed = [a for a in answers if isinstance(a, Exception)]
+        if len(failed) == len(answers):
+            raise failed[0]
+        if failed:
+            print(f"⚠️ {len(failed)} of {len(answers)} parts of {os.path.basename(file_path)} failed: {failed[0]}")
+        return merge_test_modules([extract_test_code(a) for a in answers if not isinstance(a, Exception) and a])
+
+    def write_chunks(self, file_path: str, sections: dict) -> List[str]:
+        # Reserve room for the longest note ("part 999 of 999")
+        note = CHUNK_NOTE.format(part=999, parts=999)
+        fixed = count_tokens(test_generation_prefix() + RequirementCombiner.build(
+            note, "", sections["url"], sections["page_title"], sections["requirements_title"]))
+        available = max(self.max_tokens - fixed, 200)
+        requirement_budget = min(count_tokens(sections["requirements"]) + 1, available // 2)
+        requirement_parts = split_text(sections["requirements"], requirement_budget, REQUIREMENT_ITEM)
+        page_parts = split_text(sections["page"], available - requirement_budget)
+
+        chunk_dir = Path(file_path).parent / "chunks"
+        chunk_dir.mkdir(exist_ok=True)
+        stem = Path(file_path).stem
+        for old in glob.glob(str(chunk_dir / f"{glob.escape(stem)}_part*.txt")):
+            os.remove(old)
+        chunk_files = []
+        for p, page in enumerate(page_parts, 1):
+            page_title = sections["page_title"]
+            if len(page_parts) > 1:
+                page_title += f" (part {p} of {len(page_parts)})"
+                page = CHUNK_NOTE.format(part=p, parts=len(page_parts)) + "\n\n" + page
+            for r, requirements in enumerate(requirement_parts, 1):
+                requirements_title = sections["requirements_title"]
+                if len(requirement_parts) > 1:
+                    requirements_title += f" (part {r} of {len(requirement_parts)})"
+                path = chunk_dir / f"{stem}_part{len(chunk_files) + 1:02d}.txt"
+                with open(path, "w", encoding="utf-8") as f:
+                    f.write(RequirementCombiner.build(page, requirements, sections["url"], page_title,
+                                                      requirements_title))
+                chunk_files.append(str(path))
+        return chunk_files
@@ -0,0 +1,203 @@
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from UrlCanonicalizer import UrlCanonicalizer
+
+
+class CrawlFrontier:
+    """Durable crawl frontier: a SQLite-backed work queue plus a seen index keyed by canonical URL.
+
+    Membership checks go through the UNIQUE index on ``url``, so neither the queue nor the
+    visited set has to live in memory. Use ``":memory:"`` for a throw-away frontier.
+    """
+
+    PENDING = "pending"
+    IN_PROGRESS = "in_progress"
+    DONE = "done"
+    FAILED = "failed"
+    DUPLICATE = "duplicate"
+    SKIPPED = "skipped"
+
+    def __init__(self, db_path: str = ":memory:", canonicalizer: UrlCanonicalizer = None):
+        self.db_path = str(db_path)
+        self.canonicalizer = canonicalizer or UrlCanonicalizer()
+        if self.db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS frontier (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT NOT NULL UNIQUE,
+                depth INTEGER NOT NULL DEFAULT 0,
+                status TEXT NOT NULL DEFAULT 'pending',
+                error TEXT,
+                discovered_at REAL,
+                updated_at REAL,
+                lastmod TEXT,
+                priority REAL NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS idx_frontier_status ON frontier (status, id);
+            CREATE TABLE IF NOT EXISTS aliases (
+                url TEXT PRIMARY KEY,
+                original_url TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS fingerprints (
+                url TEXT PRIMARY KEY,
+                simhash INTEGER NOT NULL
+            );
+            """
+        )
+        columns = {row[1] for row in self.conn.execute("PRAGMA table_info(frontier)")}
+        if "lastmod" not in columns:
+            self.conn.execute("ALTER TABLE frontier ADD COLUMN lastmod TEXT")
+        if "priority" not in columns:
+            self.conn.execute("ALTER TABLE frontier ADD COLUMN priority REAL NOT NULL DEFAULT 0")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_frontier_priority ON frontier (status, priority, id)")
+        self.conn.commit()
+
+    def canonical_url(self, url: str) -> str:
+        return self.canonicalizer.canonicalize(url)
+
+    def __contains__(self, url: str) -> bool:
+        row = self.conn.execute(
+            "SELECT 1 FROM frontier WHERE url = ?", (self.canonical_url(url),)
+        ).fetchone()
+        return row is not None
+
+    def __len__(self) -> int:
+        return self.conn.execute("SELECT COUNT(*) FROM frontier").fetchone()[0]
+
+    def add(self, url: str, depth: int = 0, priority: Optional[float] = None) -> bool:
+        """Queue a URL unless it was seen before. Returns True if it is new."""
+        cursor = self.conn.execute(
+            "INSERT OR IGNORE INTO frontier (url, depth, discovered_at, priority) VALUES (?, ?, ?, ?)",
+            (self.canonical_url(url), depth, time.time(), depth if priority is None else priority),
+        )
+        self.conn.commit()
+        return cursor.rowcount == 1
+
+    def add_many(self, urls: Iterable[str], depth: int, priorities: Optional[Dict[str, float]] = None) -> int:
+        """Queue new URLs. Lower priorities are claimed first; without ``priorities`` the depth is used."""
+        now = time.time()
+        priorities = priorities or {}
+        before = self.conn.total_changes
+        self.conn.executemany(
+            "INSERT OR IGNORE INTO frontier (url, depth, discovered_at, priority) VALUES (?, ?, ?, ?)",
+            ((self.canonical_url(u), depth, now, priorities.get(u, depth)) for u in urls),
+        )
+        self.conn.commit()
+        return self.conn.total_changes - before
+
+    def add_seeds(self, seeds: Iterable[Tuple[str, Optional[str]]], depth: int = 1,
+                  priorities: Optional[Dict[str, float]] = None) -> int:
+        """Queue ``(url, lastmod)`` pairs from a sitemap; lastmod is kept for already known URLs too."""
+        now = time.time()
+        priorities = priorities or {}
+        before = len(self)
+        rows = [(self.canonical_url(url), depth, now, lastmod, priorities.get(url, depth)) for url, lastmod in seeds]
+        self.conn.executemany(
+            "INSERT INTO frontier (url, depth, discovered_at, lastmod, priority) VALUES (?, ?, ?, ?, ?) "
+            "ON CONFLICT(url) DO UPDATE SET lastmod = COALESCE(excluded.lastmod, lastmod)",
+            rows,
+        )
+        self.conn.commit()
+        return len(self) - before
+
+    def lastmod(self, url: str) -> Optional[str]:
+        row = self.conn.execute(
+            "SELECT lastmod FROM frontier WHERE url = ?", (self.canonical_url(url),)
+        ).fetchone()
+        return row[0] if row else None
+
+    def next_batch(self, limit: int) -> List[Tuple[str, int]]:
+        """Claim up to ``limit`` pending URLs by priority, then discovery order, and mark them in progress."""
+        rows = self.conn.execute(
+            "SELECT id, url, depth FROM frontier WHERE status = ? ORDER BY priority, id LIMIT ?",
+            (self.PENDING, limit),
+        ).fetchall()
+        if rows:
+            self.conn.executemany(
+                "UPDATE frontier SET status = ?, updated_at = ? WHERE id = ?",
+                ((self.IN_PROGRESS, time.time(), row[0]) for row in rows),
+            )
+            self.conn.commit()
+        return [(url, depth) for _, url, depth in rows]
+
+    def mark_done(self, url: str) -> None:
+        self._set_status(url, self.DONE)
+
+    def mark_failed(self, url: str, error: str = "") -> None:
+        self._set_status(url, self.FAILED, error)
+
+    def mark_skipped(self, url: str, reason: str = "") -> None:
+        """Claimed but left out, e.g. because its path prefix quota is used up."""
+        self._set_status(url, self.SKIPPED, reason)
+
+    def release(self, url: str) -> None:
+        """Put a claimed URL back into the queue, e.g. when the crawl budget ran out before it was fetched."""
+        self._set_status(url, self.PENDING)
+
+    def _set_status(self, url: str, status: str, error: str = None) -> None:
+        self.conn.execute(
+            "UPDATE frontier SET status = ?, error = ?, updated_at = ? WHERE url = ?",
+            (status, error, time.time(), self.canonical_url(url)),
+        )
+        self.conn.commit()
+
+    def record_alias(self, url: str, original_url: str) -> None:
+        """Record ``url`` as a near-duplicate of ``original_url`` instead of processing it again."""
+        url = self.canonical_url(url)
+        self.conn.execute("INSERT OR REPLACE INTO aliases (url, original_url) VALUES (?, ?)", (url, original_url))
+        self.conn.commit()
+        self._set_status(url, self.DUPLICATE)
+
+    def aliases(self) -> Dict[str, str]:
+        return dict(self.conn.execute("SELECT url, original_url FROM aliases").fetchall())
+
+    def add_fingerprint(self, url: str, fingerprint: int) -> None:
+        # SQLite integers are signed 64-bit
+        signed = fingerprint - (1 << 64) if fingerprint >= 1 << 63 else fingerprint
+        self.conn.execute("INSERT OR REPLACE INTO fingerprints (url, simhash) VALUES (?, ?)",
+                          (self.canonical_url(url), signed))
+        self.conn.commit()
+
+    def fingerprints(self) -> Iterator[Tuple[str, int]]:
+        for url, signed in self.conn.execute("SELECT url, simhash FROM fingerprints"):
+            yield url, signed % (1 << 64)
+
+    def fetched_urls(self) -> Iterator[str]:
+        """URLs a previous run already spent crawl budget on."""
+        for (url,) in self.conn.execute(
+                "SELECT url FROM frontier WHERE status IN (?, ?, ?)", (self.DONE, self.FAILED, self.DUPLICATE)):
+            yield url
+
+    def requeue_in_progress(self) -> int:
+        """Put URLs that were claimed by a crashed run, or skipped for a quota, back into the queue.
+        The resumed run's scheduler decides again whether they fit its budget."""
+        cursor = self.conn.execute(
+            "UPDATE frontier SET status = ?, error = NULL WHERE status IN (?, ?)",
+            (self.PENDING, self.IN_PROGRESS, self.SKIPPED)
+        )
+        self.conn.commit()
+        return cursor.rowcount
+
+    def stats(self) -> dict:
+        rows = self.conn.execute("SELECT status, COUNT(*) FROM frontier GROUP BY status").fetchall()
+        return dict(rows)
+
+    def reset(self, keep_duplicates: bool = False) -> None:
+        """Empty the queue for a new crawl. With ``keep_duplicates`` the fingerprints and aliases stay, so
+        near-duplicates keep the representative page they had in earlier runs."""
+        if keep_duplicates:
+            self.conn.execute("DELETE FROM frontier")
+        else:
+            self.conn.executescript("DELETE FROM frontier; DELETE FROM aliases; DELETE FROM fingerprints;")
+        self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,148 @@
+import re
+import threading
+import time
+from typing import Callable, Dict, Iterable, Optional, Union
+from urllib.parse import parse_qsl, urlparse
+
+PAGINATION_QUERY_PARAMS = {"page", "p", "pg", "offset", "start", "seite"}
+PAGINATION_PATH = re.compile(r"/(page|seite)/(\d+)/?$", re.IGNORECASE)
+INTERACTIVE_HINTS = re.compile(
+    r"login|signin|sign-in|logout|register|signup|sign-up|search|contact|checkout|cart|basket|account|"
+    r"settings|profile|edit|create|new|upload|form|booking|order", re.IGNORECASE)
+
+
+def pagination_number(url: str) -> int:
+    """Page number of a pagination link (``?page=7``, ``/page/7``), 0 if the URL is no pagination link."""
+    parsed = urlparse(url)
+    for key, value in parse_qsl(parsed.query):
+        if key.lower() in PAGINATION_QUERY_PARAMS and value.isdigit():
+            return int(value)
+    match = PAGINATION_PATH.search(parsed.path)
+    return int(match.group(2)) if match else 0
+
+
+def breadth_first(url: str, depth: int, page=None) -> float:
+    return float(depth)
+
+
+def shortest_path(url: str, depth: int, page=None) -> float:
+    parsed = urlparse(url)
+    segments = [s for s in parsed.path.split("/") if s]
+    return float(len(segments) + len(parse_qsl(parsed.query)))
+
+
+def interactive_first(url: str, depth: int, page=None) -> float:
+    """Breadth-first, but links from form-heavy pages and to login/search/checkout-like paths go first."""
+    score = float(depth)
+    if page is not None:
+        score -= min(page.interactive_elements, 20) / 10
+    if INTERACTIVE_HINTS.search(urlparse(url).path):
+        score -= 1.0
+    return score
+
+
+PRIORITIES: Dict[str, Callable] = {
+    "breadth_first": breadth_first,
+    "shortest_path": shortest_path,
+    "interactive_first": interactive_first,
+}
+
+
+class CrawlScheduler:
+    """Crawl budget and link ordering.
+
+    Limits the crawl by page count, depth, wall-clock time and per-path-prefix quotas
+    (``{"/blog/": 20}``), filters URLs with include/exclude regexes and assigns each link a
+    priority; lower values are crawled first. Pagination links beyond the first page are
+    pushed back by ``pagination_penalty`` per page so a fixed budget is not spent on them.
+    """
+
+    def __init__(self, max_pages: Optional[int] = None, max_depth: Optional[int] = None,
+                 max_seconds: Optional[float] = None, prefix_quotas: Optional[Dict[str, int]] = None,
+                 include: Iterable[str] = (), exclude: Iterable[str] = (),
+                 priority: Union[str, Callable] = "breadth_first", pagination_penalty: float = 2.0):
+        self.max_pages = max_pages
+        self.max_depth = max_depth
+        self.max_seconds = max_seconds
+        self.prefix_quotas = dict(prefix_quotas or {})
+        self.include = [re.compile(p) for p in include]
+        self.exclude = [re.compile(p) for p in exclude]
+        if isinstance(priority, str):
+            if priority not in PRIORITIES:
+                raise ValueError(f"Unknown priority: {priority}. Choose from {', '.join(PRIORITIES)}.")
+            priority = PRIORITIES[priority]
+        self.priority = priority
+        self.pagination_penalty = pagination_penalty
+        self.pages = 0
+        self.prefix_counts: Dict[str, int] = {}
+        self.deadline = None
+        self._lock = threading.Lock()
+
+    def start(self, frontier=None):
+        """Start the clock; with a resumed ``frontier`` the pages it already fetched count against the budget."""
+        self.pages = 0
+        self.prefix_counts = {}
+        if frontier is not None:
+            for url in frontier.fetched_urls():
+                self._count(url)
+        self.deadline = time.monotonic() + self.max_seconds if self.max_seconds is not None else None
+        return self
+
+    def allows(self, url: str, depth: int) -> bool:
+        if self.max_depth is not None and depth > self.max_depth:
+            return False
+        if self.include and not any(p.search(url) for p in self.include):
+            return False
+        return not any(p.search(url) for p in self.exclude)
+
+    def priority_of(self, url: str, depth: int, page=None) -> float:
+        score = self.priority(url, depth, page)
+        number = pagination_number(url)
+        if number > 1:
+            score += self.pagination_penalty * min(number - 1, 10)
+        return score
+
+    def rank(self, links: Iterable[str], depth: int, page=None) -> Dict[str, float]:
+        """Allowed links with their priority."""
+        return {link: self.priority_of(link, depth, page) for link in links if self.allows(link, depth)}
+
+    def remaining(self) -> Optional[int]:
+        """Pages left in the budget (None = unlimited, 0 once the page or time budget is used up)."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return 0
+        if self.max_pages is None:
+            return None
+        return max(0, self.max_pages - self.pages)
+
+    def exhausted(self) -> bool:
+        return self.remaining() == 0
+
+    def reserve(self, url: str) -> bool:
+        """Count ``url`` against the budget. False if the budget or its path prefix quota is used up."""
+        with self._lock:
+            if self.exhausted():
+                return False
+            prefix = self._prefix(url)
+            if prefix is not None and self.prefix_counts.get(prefix, 0) >= self.prefix_quotas[prefix]:
+                return False
+            self._count(url)
+            return True
+
+    def refusal(self, url: str) -> str:
+        """Why ``reserve(url)`` fails: the time or page budget, or the path prefix quota."""
+        if self.deadline is not None and time.monotonic() >= self.deadline:
+            return "time budget used up"
+        if self.max_pages is not None and self.pages >= self.max_pages:
+            return "page budget used up"
+        return f"path quota for {self._prefix(url)} used up"
+
+    def _count(self, url: str) -> None:
+        self.pages += 1
+        prefix = self._prefix(url)
+        if prefix is not None:
+            self.prefix_counts[prefix] = self.prefix_counts.get(prefix, 0) + 1
+
+    def _prefix(self, url: str) -> Optional[str]:
+        path = urlparse(url).path or "/"
+        matches = [prefix for prefix in self.prefix_quotas if path.startswith(prefix)]
+        return max(matches, key=len) if matches else None
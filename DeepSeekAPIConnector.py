@@ -1,45 +1,78 @@
 import os
+from typing import Callable, List
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from LLMDispatcher import LLMDispatcher
+from PromptTemplates import test_generation_messages, test_generation_prefix
+from ResponseCache import ResponseCache
 
 
 class DeepSeekAPIConnector:
-    def __init__(self,  model: str):
+    def __init__(self,  model: str, dispatcher: LLMDispatcher = None, cache: ResponseCache = None,
+                 use_cache: bool = True, base_url: str = None):
         load_dotenv()  
         self.api_key = os.getenv("DEEPSEEK_API_KEY")
-        self.base_url = "https://api.deepseek.com"
+        self.base_url = base_url or "https://api.deepseek.com"
         self.model = model
         self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        self.dispatcher = dispatcher or LLMDispatcher.shared()
+        self.cache = (cache or ResponseCache()) if use_cache else None
     
     def ask_with_file(self, file_path: str) -> str:
-        prompt = (
-            "The attached file content contains a scraped web application, test requirements, test URL and an example test.\n\n"
-            "1. Analyze only the currently attached file.\n"
-            "2. Ignore all previous prompts, contexts, or files.\n"
-            "3. Use only the TEST_URL specified in the file.\n"
-            "4. For each test requirement write an executable test and use the test example as the template.\n"
-            "5. Test functions must have descriptive names and be fully executable.\n"
-            "6. Respond only with Python code – no explanatory text.\n"
-            "7. At the very top of the code, include a comment line with the used URL, e.g., # URL used: https://...\n"
-            "8. Add a 5-second wait after each test to allow the web server to handle requests.\n"
-            "9. Make sure every test class name starts with Test that it can be processed from pytest \n"
-        )
+        return self.dispatcher.run(self.ask_with_file_async(file_path))
 
-        # Dateiinhalt lesen (z. B. HTML, JSON, etc.)
-        with open(file_path, "r", encoding="utf-8") as f:
-            file_content = f.read()
+    def ask_many(self, file_paths: List[str]) -> List:
+        """Answers for all files, generated concurrently. A failed file yields its exception."""
+        return self.dispatcher.map(self.ask_with_file_async, file_paths)
 
-        # Prompt + Dateiinhalt kombinieren
-        full_prompt = f"{prompt}\n\n---\n\nFile content:\n```text\n{file_content}\n```"
+    async def ask_with_file_async(self, file_path: str) -> str:
+        key = self.cache_key(file_path)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"♻️ Antwort aus dem Cache: {os.path.basename(str(file_path))}")
+                return cached
 
-        response = self.client.chat.completions.create(
+        response = await self.dispatcher.chat(
+            self.async_client,
             model=self.model,
-            messages=[
-                {"role": "system", "content": ''' You are an experienced developer. Analyze the provided file, which includes a scraped website, 
-                manual test cases, the TEST_URL, and an example test. From this, identify testable features and 
-                generate Playwright tests compatible with pytest. Use only the TEST_URL given in the file.'''},
-                {"role": "user", "content": full_prompt},
-            ],
+            messages=self.build_messages(file_path),
             stream=False
         )
-        return response.choices[0].message.content
+        answer = response.choices[0].message.content
+        if self.cache is not None:
+            self.cache.put(key, self.model, answer)
+        return answer
+
+    def stream_with_file(self, file_path: str, on_text: Callable[[str], None]) -> str:
+        """Like ask_with_file, but ``on_text`` receives the answer while it is generated."""
+        return self.dispatcher.run(self.stream_with_file_async(file_path, on_text))
+
+    async def stream_with_file_async(self, file_path: str, on_text: Callable[[str], None]) -> str:
+        key = self.cache_key(file_path)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                print(f"♻️ Antwort aus dem Cache: {os.path.basename(str(file_path))}")
+                on_text(cached)
+                return cached
+
+        answer = await self.dispatcher.chat_stream(
+            self.async_client,
+            on_text,
+            model=self.model,
+            messages=self.build_messages(file_path)
+        )
+        if self.cache is not None:
+            self.cache.put(key, self.model, answer)
+        return answer
+
+    def cache_key(self, file_path: str) -> str:
+        return ResponseCache.file_key(self.model, test_generation_prefix(), file_path)
+
+    def build_messages(self, file_path: str) -> list:
+        # Shared instructions and example test first, so DeepSeek's prefix cache can reuse them
+        with open(file_path, "r", encoding="utf-8") as f:
+            return test_generation_messages(f.read())
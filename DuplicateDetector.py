@@ -0,0 +1,72 @@
+import hashlib
+import re
+import threading
+from typing import Dict, List, Optional, Tuple
+
+FINGERPRINT_BITS = 64
+
+
+def simhash(text: str, shingle_size: int = 3) -> int:
+    """64-bit SimHash over word shingles; near-identical texts differ in only a few bits."""
+    words = re.findall(r"\w+", text.lower())
+    if len(words) < shingle_size:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + shingle_size]) for i in range(len(words) - shingle_size + 1)]
+    weights = [0] * FINGERPRINT_BITS
+    for shingle in shingles:
+        h = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if h >> bit & 1 else -1
+    return sum(1 << bit for bit in range(FINGERPRINT_BITS) if weights[bit] > 0)
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class DuplicateDetector:
+    """Finds pages whose text is a near-duplicate of an already crawled page.
+
+    Fingerprints are split into ``max_distance + 1`` bands: two fingerprints within
+    ``max_distance`` bits must agree on at least one band, so only those candidates are compared.
+    """
+
+    def __init__(self, max_distance: int = 3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self.band_bits = FINGERPRINT_BITS // self.bands
+        self._index: Dict[Tuple[int, int], List[Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+
+    def _band_keys(self, fingerprint: int):
+        mask = (1 << self.band_bits) - 1
+        return [(i, fingerprint >> (i * self.band_bits) & mask) for i in range(self.bands)]
+
+    def _find(self, fingerprint: int) -> Optional[str]:
+        for key in self._band_keys(fingerprint):
+            for other, url in self._index.get(key, ()):
+                if hamming_distance(fingerprint, other) <= self.max_distance:
+                    return url
+        return None
+
+    def _add(self, url: str, fingerprint: int) -> None:
+        for key in self._band_keys(fingerprint):
+            self._index.setdefault(key, []).append((fingerprint, url))
+
+    def add(self, url: str, fingerprint: int) -> None:
+        with self._lock:
+            self._add(url, fingerprint)
+
+    def find(self, fingerprint: int) -> Optional[str]:
+        with self._lock:
+            return self._find(fingerprint)
+
+    def check(self, url: str, text: str) -> Tuple[Optional[str], int]:
+        """Return (url of the original page or None, fingerprint) and index the page if it is new."""
+        fingerprint = simhash(text)
+        with self._lock:
+            original = self._find(fingerprint)
+            if original is None:
+                self._add(url, fingerprint)
+        return original, fingerprint
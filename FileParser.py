@@ -1,20 +1,17 @@
 import os
 import re
-from bs4 import BeautifulSoup
-from bs4 import XMLParsedAsHTMLWarning
-import warnings
 
+from PageParser import read_title
 
 
 class FileParser:
-    def __init__(self, folder_path):
+    def __init__(self, folder_path, page_store=None):
         self.folder_path = folder_path
+        self.page_store = page_store
 
     def parse_html(self, html_content):
         """Extrahiere Informationen aus HTML – anpassbar."""
-        warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
-        soup = BeautifulSoup(html_content, "html.parser")
-        title = soup.title.string if soup.title else "Kein Titel"
+        title = read_title(html_content) or "Kein Titel"
         return {
             "title": title,
             "html": html_content
@@ -25,6 +22,14 @@ class FileParser:
         """Liest alle HTML-Dateien und gibt sie als Liste von Dictionaries zurück."""
         parsed_files = []
 
+        # Mit Page Store kommt die URL aus dem Manifest statt aus dem Dateinamen
+        if self.page_store is not None:
+            for entry in self.page_store.entries():
+                data = self.parse_html(self.page_store.get(entry["url"]))
+                data["filename"] = entry["url"]
+                parsed_files.append(data)
+            return parsed_files
+
         for filename in os.listdir(self.folder_path):
             if filename.endswith(".html"):
                 file_path = os.path.join(self.folder_path, filename)
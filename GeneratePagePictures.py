@@ -1,22 +1,66 @@
+
 from playwright.sync_api import sync_playwright
 import os
 
-def take_screenshots(urls, output_dir):
-    os.makedirs(output_dir, exist_ok=True)
+def screenshot_filename(url):
+    # Clean the filename to avoid invalid characters
+    return url.replace("http://", "").replace("https://", "").replace("/", "_").replace(":","_") + ".png"
+
+
+class ScreenshotBrowser:
+    """Keeps one Chromium page open so consecutive screenshots skip the browser start-up."""
+
+    def __init__(self, viewport=(1280, 800), full_page=True, max_height=10000, timeout=15000):
+        self.viewport = {"width": viewport[0], "height": viewport[1]}
+        self.full_page = full_page
+        self.max_height = max_height
+        self.timeout = timeout
+        self.playwright = None
+        self.browser = None
+        self.page = None
 
-    with sync_playwright() as p:
-        browser = p.chromium.launch(headless=True)
-        page = browser.new_page()
+    def __enter__(self):
+        return self
 
+    def _start(self):
+        # Started on first use so a missing browser surfaces per URL like before
+        if self.playwright is None:
+            self.playwright = sync_playwright().start()
+        if self.browser is None:
+            self.browser = self.playwright.chromium.launch(headless=True)
+        self.page = self.browser.new_page(viewport=self.viewport)
+
+    def __exit__(self, *exc):
+        if self.browser:
+            self.browser.close()
+        if self.playwright:
+            self.playwright.stop()
+
+    def take(self, urls, output_dir):
+        os.makedirs(output_dir, exist_ok=True)
         for url in urls:
             try:
-                page.goto(url, timeout=15000)
-                # Clean the filename to avoid invalid characters
-                filename = url.replace("http://", "").replace("https://", "").replace("/", "_").replace(":","_") + ".png"
-                path = os.path.join(output_dir, filename)
-                page.screenshot(path=path, full_page=True)
+                if self.page is None:
+                    self._start()
+                self.page.goto(url, timeout=self.timeout)
+                path = os.path.join(output_dir, screenshot_filename(url))
+                self._capture(path)
                 print(f"✅ Saved screenshot: {path}")
             except Exception as e:
                 print(f"❌ Failed to load {url}: {e}")
 
-        browser.close()
+    def _capture(self, path):
+        if not self.full_page:
+            self.page.screenshot(path=path)
+            return
+        height = self.page.evaluate("() => document.documentElement.scrollHeight")
+        if height > self.max_height:
+            clip = {"x": 0, "y": 0, "width": self.viewport["width"], "height": self.max_height}
+            self.page.screenshot(path=path, full_page=True, clip=clip)
+        else:
+            self.page.screenshot(path=path, full_page=True)
+
+
+def take_screenshots(urls, output_dir):
+    with ScreenshotBrowser() as browser:
+        browser.take(urls, output_dir)
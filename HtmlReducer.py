@@ -0,0 +1,178 @@
+import functools
+import threading
+from typing import List, Optional, Tuple
+
+from bs4 import BeautifulSoup, Comment, Tag
+
+from LLMDispatcher import estimate_tokens
+from PageParser import resolve_parser
+
+try:
+    import tiktoken
+except ImportError:  # optional, token counts are estimated when tiktoken is not installed
+    tiktoken = None
+
+DROPPED_TAGS = ("script", "style", "svg", "noscript", "template", "canvas", "meta", "link", "path", "iframe")
+CONTROL_TAGS = {"input", "button", "select", "textarea"}
+LANDMARK_TAGS = {"header", "nav", "main", "aside", "footer", "dialog", "form", "fieldset", "table"}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+KEPT_ATTRIBUTES = ("id", "name", "type", "role", "aria-label", "placeholder", "href", "action", "method",
+                   "for", "value", "data-testid", "data-test", "data-cy", "required", "disabled", "checked")
+
+
+@functools.lru_cache(maxsize=None)
+def _encoding(name: str):
+    return tiktoken.get_encoding(name)
+
+
+def count_tokens(text: str, encoding: str = "o200k_base") -> int:
+    """Token count with tiktoken if installed, otherwise about four characters per token."""
+    if tiktoken is None:
+        return estimate_tokens(text)
+    return len(_encoding(encoding).encode(text, disallowed_special=()))
+
+
+class HtmlReducer:
+    """Reduces a scraped page to a compact outline of what a test can interact with.
+
+    Scripts, styles, SVG and plain text are dropped. Kept are headings, landmarks, forms with
+    their controls and labels, buttons, links and elements with an ARIA role, one line each
+    with the attributes usable as selectors. Identical lines (repeated navigation) are kept once.
+    If the outline exceeds ``max_tokens``, links are dropped first, then the outline is cut off.
+    With ``max_tokens=None`` it is never cut, e.g. when ChunkedGenerator splits large prompts instead.
+    """
+
+    def __init__(self, max_tokens: Optional[int] = 6000, max_text: int = 80, max_options: int = 10,
+                 encoding: str = "o200k_base", parser: Optional[str] = None):
+        self.max_tokens = max_tokens
+        self.max_text = max_text
+        self.max_options = max_options
+        self.encoding = encoding
+        self.parser = resolve_parser(parser)
+        self.pages = 0
+        self.original_tokens = 0
+        self.reduced_tokens = 0
+        self._lock = threading.Lock()
+
+    def count(self, text: str) -> int:
+        return count_tokens(text, self.encoding)
+
+    def reduce(self, html: str, reserved_tokens: int = 0) -> str:
+        """Outline of ``html`` within ``max_tokens - reserved_tokens`` (the rest of the prompt)."""
+        soup = BeautifulSoup(html, self.parser)
+        for tag in soup.find_all(DROPPED_TAGS):
+            tag.decompose()
+        for comment in soup.find_all(string=lambda s: isinstance(s, Comment)):
+            comment.extract()
+
+        labels = {label["for"]: self._text(label) for label in soup.find_all("label", attrs={"for": True})}
+        lines: List[Tuple[str, bool]] = []
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        if title:
+            lines.append((f'title "{title[:self.max_text]}"', False))
+        self._walk(soup.body or soup, 0, labels, lines, set())
+
+        if self.max_tokens is None:
+            outline = "\n".join(line for line, _ in lines)
+        else:
+            outline = self._fit(lines, max(0, self.max_tokens - reserved_tokens))
+        original, reduced = self.count(html), self.count(outline)
+        with self._lock:
+            self.pages += 1
+            self.original_tokens += original
+            self.reduced_tokens += reduced
+        print(f"✂️ Page reduced: {original} → {reduced} tokens ({self._ratio(original, reduced):.0%} smaller)")
+        return outline
+
+    def _walk(self, node: Tag, depth: int, labels: dict, lines: List[Tuple[str, bool]], seen: set) -> None:
+        for child in node.children:
+            if not isinstance(child, Tag):
+                continue
+            line = self._describe(child, labels)
+            if line is None:
+                self._walk(child, depth, labels, lines, seen)
+                continue
+            line = "  " * depth + line
+            # Repeated navigation and footers produce the same lines over and over
+            if child.name not in LANDMARK_TAGS and line in seen:
+                continue
+            seen.add(line)
+            lines.append((line, child.name == "a"))
+            if child.name not in CONTROL_TAGS:
+                self._walk(child, depth + 1, labels, lines, seen)
+
+    def _describe(self, tag: Tag, labels: dict) -> Optional[str]:
+        name = tag.name
+        if name in HEADING_TAGS:
+            return f'{name} "{self._text(tag)}"'
+        if name in LANDMARK_TAGS or name in CONTROL_TAGS or name == "a" or tag.get("role") or tag.get("aria-label"):
+            parts = [name + self._attributes(tag)]
+            if name == "select":
+                options = [self._text(o) for o in tag.find_all("option")]
+                extra = f", +{len(options) - self.max_options}" if len(options) > self.max_options else ""
+                parts.append(f"options={options[:self.max_options]}{extra}")
+            elif name in ("button", "a") or (name not in LANDMARK_TAGS and name not in CONTROL_TAGS):
+                text = self._text(tag)
+                if text:
+                    parts.append(f'"{text}"')
+            label = labels.get(tag.get("id")) if tag.get("id") else None
+            if label is None and name in CONTROL_TAGS and tag.find_parent("label") is not None:
+                label = self._text(tag.find_parent("label"))
+            if label:
+                parts.append(f'label="{label}"')
+            return " ".join(parts)
+        return None
+
+    def _attributes(self, tag: Tag) -> str:
+        attributes = []
+        for key in KEPT_ATTRIBUTES:
+            value = tag.get(key)
+            if value is None:
+                continue
+            if isinstance(value, list):
+                value = " ".join(value)
+            attributes.append(key if value == "" else f'{key}="{value[:self.max_text]}"')
+        classes = tag.get("class")
+        if classes and not tag.get("id"):
+            attributes.append(f'class="{" ".join(classes[:3])}"')
+        return f"[{' '.join(attributes)}]" if attributes else ""
+
+    def _text(self, tag: Tag) -> str:
+        text = " ".join(tag.get_text(" ", strip=True).split())
+        return text[:self.max_text] + ("…" if len(text) > self.max_text else "")
+
+    def _fit(self, lines: List[Tuple[str, bool]], budget: int) -> str:
+        costs = [self.count(line) + 1 for line, _ in lines]
+        total = sum(costs)
+        keep = [True] * len(lines)
+        # Links are the least useful part of the outline, drop them from the end first
+        for i in range(len(lines) - 1, -1, -1):
+            if total <= budget:
+                break
+            if lines[i][1]:
+                keep[i] = False
+                total -= costs[i]
+        kept = [(line, cost) for (line, _), cost, k in zip(lines, costs, keep) if k]
+        result, used = [], 0
+        for line, cost in kept:
+            if used + cost > budget:
+                break
+            result.append(line)
+            used += cost
+        omitted = len(lines) - len(result)
+        if omitted:
+            result.append(f"... ({omitted} elements omitted to stay within the token budget)")
+        return "\n".join(result)
+
+    @staticmethod
+    def _ratio(original: int, reduced: int) -> float:
+        return 1 - reduced / original if original else 0.0
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "pages": self.pages,
+                "original_tokens": self.original_tokens,
+                "reduced_tokens": self.reduced_tokens,
+                "reduction": round(self._ratio(self.original_tokens, self.reduced_tokens), 3),
+            }
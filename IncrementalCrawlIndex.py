@@ -0,0 +1,93 @@
+import hashlib
+import os
+import sqlite3
+import time
+from typing import Optional, Set
+
+
+class IncrementalCrawlIndex:
+    """Per-URL validators (ETag, Last-Modified, content hash) that survive between runs.
+
+    The crawler sends conditional requests based on this index and records whether each page
+    changed, so later stages can skip pages that are identical to the previous run.
+    """
+
+    def __init__(self, db_path: str):
+        self.db_path = str(db_path)
+        os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(self.db_path)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                etag TEXT,
+                last_modified TEXT,
+                content_hash TEXT,
+                changed INTEGER NOT NULL DEFAULT 1,
+                last_checked REAL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def content_hash(html: str) -> str:
+        return hashlib.sha256(html.encode("utf-8")).hexdigest()
+
+    def begin_run(self) -> None:
+        self.conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('run_started', ?)", (str(time.time()),))
+        self.conn.commit()
+
+    def _run_started(self) -> float:
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'run_started'").fetchone()
+        return float(row[0]) if row else 0.0
+
+    def get_hash(self, url: str) -> Optional[str]:
+        row = self.conn.execute("SELECT content_hash FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def last_checked(self, url: str) -> Optional[float]:
+        row = self.conn.execute("SELECT last_checked FROM pages WHERE url = ?", (url,)).fetchone()
+        return row[0] if row else None
+
+    def conditional_headers(self, url: str) -> dict:
+        row = self.conn.execute("SELECT etag, last_modified FROM pages WHERE url = ?", (url,)).fetchone()
+        headers = {}
+        if row:
+            if row[0]:
+                headers["If-None-Match"] = row[0]
+            if row[1]:
+                headers["If-Modified-Since"] = row[1]
+        return headers
+
+    def record(self, url: str, etag: Optional[str], last_modified: Optional[str],
+               content_hash: Optional[str], changed: bool) -> None:
+        """Store fresh validators; ``None`` values keep what is already stored."""
+        self.conn.execute(
+            """
+            INSERT INTO pages (url, etag, last_modified, content_hash, changed, last_checked)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(url) DO UPDATE SET
+                etag = COALESCE(excluded.etag, etag),
+                last_modified = COALESCE(excluded.last_modified, last_modified),
+                content_hash = COALESCE(excluded.content_hash, content_hash),
+                changed = excluded.changed,
+                last_checked = excluded.last_checked
+            """,
+            (url, etag, last_modified, content_hash, int(changed), time.time()),
+        )
+        self.conn.commit()
+
+    def unchanged_urls(self) -> Set[str]:
+        """URLs checked during the current run that were unchanged (304 or identical hash)."""
+        rows = self.conn.execute(
+            "SELECT url FROM pages WHERE changed = 0 AND last_checked >= ?", (self._run_started(),)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def close(self) -> None:
+        self.conn.close()
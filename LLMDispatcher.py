@@ -0,0 +1,209 @@
+import asyncio
+import random
+import re
+import threading
+import time
+from typing import Awaitable, Callable, Iterable, List, Optional
+
+import openai
+
+from RateLimiter import parse_retry_after
+
+RETRYABLE_ERRORS = (openai.RateLimitError, openai.APIConnectionError, openai.APITimeoutError,
+                    openai.InternalServerError)
+_DURATION_PART = re.compile(r"(\d+(?:\.\d+)?)(ms|s|m|h)")
+_UNIT_SECONDS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token) for client-side TPM budgeting."""
+    return max(1, len(text) // 4)
+
+
+def parse_reset_duration(value: Optional[str]) -> Optional[float]:
+    """Parse ``x-ratelimit-reset-*`` values such as ``"20ms"``, ``"1.5s"`` or ``"6m0s"`` into seconds."""
+    if not value:
+        return None
+    parts = _DURATION_PART.findall(value.strip())
+    if not parts:
+        return None
+    return sum(float(amount) * _UNIT_SECONDS[unit] for amount, unit in parts)
+
+
+class _MinuteBudget:
+    """Token bucket refilled continuously with ``per_minute`` units per minute."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.available = float(per_minute)
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.available = min(self.capacity, self.available + (now - self.updated) * self.capacity / 60.0)
+        self.updated = now
+
+    async def acquire(self, amount: float) -> None:
+        amount = min(amount, self.capacity)
+        while True:
+            self._refill()
+            if self.available >= amount:
+                self.available -= amount
+                return
+            # Re-check at least every second: adjust() may hand back over-estimated tokens
+            await asyncio.sleep(min(1.0, (amount - self.available) * 60.0 / self.capacity))
+
+    def adjust(self, estimated: float, actual: float) -> None:
+        """Correct an estimate once the real usage is known (may go below zero)."""
+        self._refill()
+        self.available = min(self.capacity, self.available + estimated - actual)
+
+
+class LLMDispatcher:
+    """Shared async gateway for LLM calls of all connectors.
+
+    Runs its own event loop in a background thread so synchronous callers can use it too.
+    At most ``max_concurrency`` requests are in flight. Optional client-side budgets keep
+    requests and tokens per minute below the provider limits. Rate-limit, timeout and 5xx errors
+    are retried with jittered exponential backoff; ``retry-after`` / ``x-ratelimit-reset-*``
+    headers take precedence over the computed delay.
+    """
+
+    _shared: Optional["LLMDispatcher"] = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_concurrency: int = 4, requests_per_minute: Optional[float] = None,
+                 tokens_per_minute: Optional[float] = None, max_retries: int = 6,
+                 base_delay: float = 1.0, max_delay: float = 60.0, default_completion_tokens: int = 2000):
+        self.max_concurrency = max(1, max_concurrency)
+        self.requests_per_minute = requests_per_minute
+        self.tokens_per_minute = tokens_per_minute
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.default_completion_tokens = default_completion_tokens
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._thread: Optional[threading.Thread] = None
+        self._start_lock = threading.Lock()
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._requests: Optional[_MinuteBudget] = None
+        self._tokens: Optional[_MinuteBudget] = None
+
+    @classmethod
+    def shared(cls) -> "LLMDispatcher":
+        """Process-wide dispatcher used by connectors that are not given their own."""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._start_lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="llm-dispatcher", daemon=True)
+                self._thread.start()
+                # Loop-bound primitives are created on the dispatcher's own loop
+                asyncio.run_coroutine_threadsafe(self._init_limits(), self._loop).result()
+            return self._loop
+
+    async def _init_limits(self) -> None:
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._requests = _MinuteBudget(self.requests_per_minute) if self.requests_per_minute else None
+        self._tokens = _MinuteBudget(self.tokens_per_minute) if self.tokens_per_minute else None
+
+    def run(self, coro: Awaitable):
+        """Run ``coro`` on the dispatcher loop and block until it is done."""
+        loop = self._ensure_loop()
+        if threading.current_thread() is self._thread:
+            raise RuntimeError("LLMDispatcher.run() must not be called from the dispatcher loop; await instead.")
+        return asyncio.run_coroutine_threadsafe(coro, loop).result()
+
+    def map(self, func: Callable[..., Awaitable], items: Iterable) -> List:
+        """Run ``func(item)`` for all items concurrently. Failed items yield their exception."""
+        async def gather():
+            return await asyncio.gather(*(func(item) for item in items), return_exceptions=True)
+        return self.run(gather())
+
+    async def chat(self, client: openai.AsyncOpenAI, **kwargs):
+        """``client.chat.completions.create(**kwargs)`` within the concurrency, RPM and TPM limits."""
+        prompt = "".join(str(m.get("content", "")) for m in kwargs.get("messages", []))
+        completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or self.default_completion_tokens
+        estimated = estimate_tokens(prompt) + completion
+
+        async def call():
+            response = await client.chat.completions.create(**kwargs)
+            if self._tokens is not None and getattr(response, "usage", None) is not None:
+                self._tokens.adjust(estimated, response.usage.total_tokens)
+            return response
+        return await self._dispatch(call, estimated)
+
+    async def chat_stream(self, client: openai.AsyncOpenAI, on_text: Callable[[str], None], **kwargs) -> str:
+        """Streamed chat completion: ``on_text`` gets every text delta as it arrives, the full text
+        is returned. An exception from ``on_text`` closes the stream (nothing more is generated).
+        Only opening the stream is retried, never a partly received answer."""
+        prompt = "".join(str(m.get("content", "")) for m in kwargs.get("messages", []))
+        completion = kwargs.get("max_completion_tokens") or kwargs.get("max_tokens") or self.default_completion_tokens
+        estimated = estimate_tokens(prompt) + completion
+
+        async def call():
+            stream = await client.chat.completions.create(stream=True, stream_options={"include_usage": True},
+                                                          **kwargs)
+            parts = []
+            try:
+                async for chunk in stream:
+                    if chunk.choices and chunk.choices[0].delta.content:
+                        parts.append(chunk.choices[0].delta.content)
+                        on_text(parts[-1])
+                    if self._tokens is not None and getattr(chunk, "usage", None) is not None:
+                        self._tokens.adjust(estimated, chunk.usage.total_tokens)
+            except RETRYABLE_ERRORS as e:
+                if parts:
+                    raise RuntimeError(f"Stream interrupted after {len(parts)} chunks: {e}") from e
+                raise
+            finally:
+                await stream.close()
+            return "".join(parts)
+        return await self._dispatch(call, estimated)
+
+    async def offload(self, func: Callable, *args):
+        """Run a blocking call (e.g. an Assistants round trip) in a thread, counted as one request."""
+        return await self._dispatch(lambda: asyncio.to_thread(func, *args), 0)
+
+    async def _dispatch(self, call: Callable[[], Awaitable], estimated_tokens: int):
+        for attempt in range(self.max_retries + 1):
+            async with self._semaphore:
+                if self._requests is not None:
+                    await self._requests.acquire(1)
+                if self._tokens is not None and estimated_tokens:
+                    await self._tokens.acquire(estimated_tokens)
+                try:
+                    return await call()
+                except RETRYABLE_ERRORS as e:
+                    if attempt == self.max_retries:
+                        raise
+                    delay = self._retry_delay(e, attempt)
+                    print(f"⏳ {type(e).__name__}, retrying in {delay:.1f}s ({attempt + 1}/{self.max_retries})...")
+            # Back off outside the semaphore so other requests are not held up
+            await asyncio.sleep(delay)
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        response = getattr(error, "response", None)
+        if response is not None:
+            headers = response.headers
+            retry_after_ms = headers.get("retry-after-ms")
+            if retry_after_ms:
+                try:
+                    return float(retry_after_ms) / 1000.0
+                except ValueError:
+                    pass
+            hinted = parse_retry_after(headers.get("retry-after"))
+            if hinted is None:
+                resets = [parse_reset_duration(headers.get(h))
+                          for h in ("x-ratelimit-reset-requests", "x-ratelimit-reset-tokens")]
+                resets = [r for r in resets if r is not None]
+                hinted = max(resets) if resets else None
+            if hinted is not None:
+                return min(self.max_delay, hinted + random.uniform(0, 0.5))
+        # Full jitter: spreads retries of concurrent requests instead of synchronising them
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
@@ -0,0 +1,115 @@
+import ast
+import json
+import os
+import re
+import threading
+import time
+from typing import Callable, Dict, List, Optional
+
+from TestUtils import TestUtils
+
+REQUIREMENT_LINE = re.compile(r"^\s*\d+[.)]\s", re.MULTILINE)
+
+
+def count_tests(test_file) -> int:
+    """Test functions in a file, including methods of Test* classes (0 if it does not parse)."""
+    try:
+        with open(test_file, "r", encoding="utf-8") as f:
+            tree = ast.parse(f.read())
+    except (OSError, SyntaxError, ValueError):
+        return 0
+    count = 0
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)) and node.name.startswith("test"):
+            count += 1
+        elif isinstance(node, ast.ClassDef) and node.name.startswith("Test"):
+            count += sum(isinstance(n, (ast.FunctionDef, ast.AsyncFunctionDef)) and n.name.startswith("test")
+                         for n in node.body)
+    return count
+
+
+def count_requirements(combined_file) -> int:
+    """Numbered requirements in a combined file."""
+    with open(combined_file, "r", encoding="utf-8") as f:
+        text = f.read()
+    start = text.find("##### TEST REQUIREMENTS")
+    return len(REQUIREMENT_LINE.findall(text[start:])) if start != -1 else 0
+
+
+class ModelCascade:
+    """Generates each test with the cheapest connector first and escalates only on failure.
+
+    ``connectors`` are ordered cheap to strong. An attempt is accepted when the test passes
+    ``TestUtils.is_test_runnable`` and contains at least ``min_tests`` tests and
+    ``min_coverage`` tests per numbered requirement; otherwise the next connector is tried.
+    Every page's attempts, latencies and the chosen model are appended to ``log_path`` (JSON lines).
+    """
+
+    def __init__(self, connectors: List, min_tests: int = 1, min_coverage: float = 0.5,
+                 log_path: Optional[str] = None, validate: Callable = TestUtils.is_test_runnable):
+        if not connectors:
+            raise ValueError("ModelCascade needs at least one connector.")
+        self.connectors = list(connectors)
+        self.min_tests = min_tests
+        self.min_coverage = min_coverage
+        self.log_path = log_path
+        self.validate = validate
+        self.decisions: Dict[str, int] = {}
+        self.escalations = 0
+        self._lock = threading.Lock()
+
+    def generate(self, combined_file, test_file, write: Callable) -> dict:
+        """Run ``write(connector, combined_file, test_file) -> bool`` along the cascade.
+
+        Returns the routing decision; ``decision["runnable"]`` tells whether the kept test passed
+        the checks. The strongest model's output is kept if no attempt passes.
+        """
+        required = max(self.min_tests, int(count_requirements(combined_file) * self.min_coverage))
+        attempts = []
+        runnable = False
+        started = time.monotonic()
+        for level, connector in enumerate(self.connectors):
+            attempt = {"model": connector.model}
+            attempt_start = time.monotonic()
+            try:
+                written = write(connector, combined_file, test_file)
+            except Exception as e:
+                written = False
+                attempt["error"] = str(e)
+            attempt["seconds"] = round(time.monotonic() - attempt_start, 2)
+            if written:
+                attempt["runnable"] = bool(self.validate(test_file))
+                attempt["tests"] = count_tests(test_file)
+                runnable = attempt["runnable"] and attempt["tests"] >= required
+            attempts.append(attempt)
+            if runnable:
+                break
+            if level + 1 < len(self.connectors):
+                reason = attempt.get("error") or f"runnable={attempt.get('runnable', False)}, " \
+                                                 f"{attempt.get('tests', 0)}/{required} tests"
+                print(f"⬆️ {os.path.basename(str(combined_file))}: {connector.model} not good enough ({reason}), "
+                      f"escalating to {self.connectors[level + 1].model}.")
+
+        decision = {
+            "file": os.path.basename(str(combined_file)),
+            "model": attempts[-1]["model"],
+            "escalated": len(attempts) > 1,
+            "runnable": runnable,
+            "required_tests": required,
+            "seconds": round(time.monotonic() - started, 2),
+            "attempts": attempts,
+        }
+        self._record(decision)
+        return decision
+
+    def _record(self, decision: dict) -> None:
+        with self._lock:
+            self.decisions[decision["model"]] = self.decisions.get(decision["model"], 0) + 1
+            self.escalations += decision["escalated"]
+            if self.log_path is not None:
+                with open(self.log_path, "a", encoding="utf-8") as f:
+                    f.write(json.dumps(decision) + "\n")
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {"models": dict(self.decisions), "escalations": self.escalations}
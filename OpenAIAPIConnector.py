@@ -1,23 +1,51 @@
+import hashlib
+import json
 import os
+import threading
 import time
 import re
+from concurrent.futures import Future
+from typing import Callable, Dict, List
 from dotenv import load_dotenv
-from openai import OpenAI
+from openai import AsyncOpenAI, OpenAI
+
+from LLMDispatcher import LLMDispatcher
+from PromptTemplates import (IMAGE_REQUIREMENTS_BATCH_PROMPT, IMAGE_REQUIREMENTS_PROMPT, test_generation_messages,
+                             test_generation_prefix)
+from ResponseCache import ResponseCache
 
 class OpenAIAPIConnector:
     TOOL_INCOMPATIBLE_MODELS = {"o3-mini", "o1", "o4-mini"}
+    FAILED_RUN_STATUSES = {"failed", "cancelled", "expired", "incomplete"}
 
-    def __init__(self, model: str):
+    def __init__(self, model: str, run_timeout: float = 600.0, max_poll_interval: float = 5.0,
+                 dispatcher: LLMDispatcher = None, cache: ResponseCache = None, use_cache: bool = True,
+                 base_url: str = None, use_assistant: bool = None):
         load_dotenv()
         self.api_key = os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OPENAI_API_KEY nicht gefunden! .env überprüfen.")
         self.model = model
-        self.client = OpenAI(api_key=self.api_key)
-        self.uses_assistant = model not in self.TOOL_INCOMPATIBLE_MODELS
+        # base_url (or OPENAI_BASE_URL) points the connector at a compatible stand-in, e.g. for tests
+        self.base_url = base_url or os.getenv("OPENAI_BASE_URL")
+        self.client = OpenAI(api_key=self.api_key, base_url=self.base_url)
+        # Retries are left to the dispatcher, which knows about all concurrent requests
+        self.async_client = AsyncOpenAI(api_key=self.api_key, base_url=self.base_url, max_retries=0)
+        self.dispatcher = dispatcher or LLMDispatcher.shared()
+        # Identical model, prompt and input file -> answer from disk instead of a new API call
+        self.cache = (cache or ResponseCache()) if use_cache else None
+        self.run_timeout = run_timeout
+        self.max_poll_interval = max_poll_interval
+        # use_assistant=False sends even tool-capable models through plain chat completions
+        self.uses_assistant = model not in self.TOOL_INCOMPATIBLE_MODELS if use_assistant is None else use_assistant
+        # Uploads (content hash -> file_id) and threads of this run, deleted together by cleanup()
+        self._uploads_lock = threading.Lock()
+        # Uploads still on their way (content hash -> Future of the file_id), so each content is sent once
+        self._uploading: Dict[str, Future] = {}
+        self.uploads_path = f"uploaded_files_{model}.json"
+        self.uploaded_files, self.thread_ids = self._load_uploads() if self.uses_assistant else ({}, [])
         if self.uses_assistant:
             self.assistant_id = self._load_or_create_assistant_id()
-            self.attached_file_ids = self._load_attached_file_ids()
 
     def _load_or_create_assistant_id(self) -> str:
         path = "assistant_id.txt"
@@ -35,20 +63,111 @@ class OpenAIAPIConnector:
             f.write(assistant.id)
         return assistant.id
 
-    def _load_attached_file_ids(self):
-        path = "attached_file_ids.txt"
-        if os.path.exists(path):
-            with open(path, "r") as f:
-                return set(line.strip() for line in f if line.strip())
-        return set()
+    def _load_uploads(self):
+        if os.path.exists(self.uploads_path):
+            with open(self.uploads_path, "r") as f:
+                state = json.load(f)
+            return state.get("files", {}), state.get("threads", [])
+        return {}, []
+
+    def _save_uploads(self) -> None:
+        with open(self.uploads_path, "w") as f:
+            json.dump({"files": self.uploaded_files, "threads": self.thread_ids}, f, indent=2)
 
     def upload_file_for_assistant(self, file_path: str) -> str:
+        """Upload ``file_path`` once per content: identical files reuse the existing file_id.
+
+        Only the bookkeeping is locked; different files upload in parallel, and a worker with the
+        same content as an upload in progress waits for that upload's file_id.
+        """
         with open(file_path, "rb") as f:
-            uploaded_file = self.client.files.create(file=f, purpose="assistants")
+            data = f.read()
+        digest = hashlib.sha256(data).hexdigest()
+        with self._uploads_lock:
+            file_id = self.uploaded_files.get(digest)
+            if file_id is not None:
+                return file_id
+            pending = self._uploading.get(digest)
+            owner = pending is None
+            if owner:
+                pending = self._uploading[digest] = Future()
+        if not owner:
+            return pending.result()
+        try:
+            uploaded_file = self.client.files.create(file=(os.path.basename(file_path), data), purpose="assistants")
+        except Exception as e:
+            with self._uploads_lock:
+                del self._uploading[digest]
+            pending.set_exception(e)
+            raise
+        with self._uploads_lock:
+            self.uploaded_files[digest] = uploaded_file.id
+            del self._uploading[digest]
+            self._save_uploads()
+        pending.set_result(uploaded_file.id)
         print(f"Datei hochgeladen: {file_path}, file_id: {uploaded_file.id}")
-        time.sleep(2)
         return uploaded_file.id
 
+    def _create_thread(self, **kwargs):
+        thread = self.client.beta.threads.create(**kwargs)
+        with self._uploads_lock:
+            self.thread_ids.append(thread.id)
+            self._save_uploads()
+        return thread
+
+    def cleanup(self) -> None:
+        """Delete all files uploaded and threads created by this connector (also those of an aborted run)."""
+        if not self.uses_assistant:
+            return
+        with self._uploads_lock:
+            for thread_id in self.thread_ids:
+                try:
+                    self.client.beta.threads.delete(thread_id)
+                except Exception as e:
+                    print(f"⚠️ Thread {thread_id} konnte nicht gelöscht werden: {e}")
+            for file_id in self.uploaded_files.values():
+                try:
+                    self.client.files.delete(file_id)
+                except Exception as e:
+                    print(f"⚠️ Datei {file_id} konnte nicht gelöscht werden: {e}")
+            if self.thread_ids or self.uploaded_files:
+                print(f"🗑️ {len(self.uploaded_files)} Dateien und {len(self.thread_ids)} Threads gelöscht.")
+            self.uploaded_files, self.thread_ids = {}, []
+            if os.path.exists(self.uploads_path):
+                os.remove(self.uploads_path)
+
+    def _run_to_completion(self, thread_id: str) -> None:
+        """Run the assistant on the thread. The run is streamed, so completion is signalled by the
+        server instead of being polled; if streaming fails, the run is polled with backoff."""
+        run_id = None
+        try:
+            with self.client.beta.threads.runs.stream(thread_id=thread_id, assistant_id=self.assistant_id) as stream:
+                for event in stream:
+                    if event.event == "thread.run.created":
+                        run_id = event.data.id
+                run = stream.get_final_run()
+        except Exception as e:
+            print(f"⚠️ Streaming des Runs fehlgeschlagen ({e}), weiter mit Polling.")
+            if run_id is None:
+                run_id = self.client.beta.threads.runs.create(thread_id=thread_id, assistant_id=self.assistant_id).id
+            run = self._poll_run(thread_id, run_id)
+        if run.status != "completed":
+            raise Exception(f"Run fehlgeschlagen: {run.status}")
+
+    def _poll_run(self, thread_id: str, run_id: str):
+        """Poll with exponential backoff until the run finishes or ``run_timeout`` is reached."""
+        deadline = time.monotonic() + self.run_timeout
+        delay = 0.25
+        while True:
+            run = self.client.beta.threads.runs.retrieve(thread_id=thread_id, run_id=run_id)
+            if run.status == "completed" or run.status in self.FAILED_RUN_STATUSES:
+                return run
+            if time.monotonic() + delay > deadline:
+                self.client.beta.threads.runs.cancel(thread_id=thread_id, run_id=run_id)
+                raise TimeoutError(f"Run {run_id} nach {self.run_timeout:.0f}s abgebrochen.")
+            time.sleep(delay)
+            delay = min(delay * 2, self.max_poll_interval)
+
     def _extract_assistant_response(self, thread_id):
         messages = self.client.beta.threads.messages.list(thread_id=thread_id)
         for msg in messages.data:
@@ -76,42 +195,39 @@ class OpenAIAPIConnector:
             return True
         return False
 
+    def _cached(self, key: str, label) -> str:
+        if self.cache is None:
+            return None
+        answer = self.cache.get(key)
+        if answer is not None:
+            print(f"♻️ Antwort aus dem Cache: {os.path.basename(str(label))}")
+        return answer
+
+    def _store(self, key: str, answer: str) -> str:
+        if self.cache is not None:
+            self.cache.put(key, self.model, answer)
+        return answer
+
     def ask_with_file(self, file_path: str) -> str:
         if self.uses_assistant:
+            key = ResponseCache.file_key(self.model, "assistant\0" + test_generation_prefix(), file_path)
+            cached = self._cached(key, file_path)
+            if cached is not None:
+                return cached
             file_id = self.upload_file_for_assistant(file_path)
-            thread = self.client.beta.threads.create()
-
-            self.client.beta.assistants.update(
-                assistant_id=self.assistant_id,
-                tool_resources={
-                    "code_interpreter": {"file_ids": [file_id]}
-                }
-            )
+            # The file is attached to this thread only; the shared assistant stays untouched,
+            # so parallel calls cannot swap each other's files
+            thread = self._create_thread(tool_resources={"code_interpreter": {"file_ids": [file_id]}})
 
-            prompt = self._build_prompt()
             self.client.beta.threads.messages.create(
                 thread_id=thread.id,
                 role="user",
-                content=prompt
+                content=test_generation_prefix()
             )
 
             all_answers = []
             while True:
-                run = self.client.beta.threads.runs.create(
-                    thread_id=thread.id,
-                    assistant_id=self.assistant_id
-                )
-
-                while True:
-                    run_status = self.client.beta.threads.runs.retrieve(
-                        thread_id=thread.id,
-                        run_id=run.id
-                    )
-                    if run_status.status == "completed":
-                        break
-                    elif run_status.status in ["failed", "cancelled", "expired"]:
-                        raise Exception(f"Run fehlgeschlagen: {run_status.status}")
-                    time.sleep(2)
+                self._run_to_completion(thread.id)
 
                 answer = self._extract_assistant_response(thread.id)
                 all_answers.append(answer)
@@ -122,92 +238,163 @@ class OpenAIAPIConnector:
                         role="user",
                         content="Bitte fahre fort. Wenn nötig, beende mit 'CONTINUE'."
                     )
-                    time.sleep(2)
                 else:
                     break
 
-            return "\n\n".join([
+            return self._store(key, "\n\n".join([
                 re.sub(r'(continue|fortsetzung)\s*$', '', a, flags=re.IGNORECASE).strip()
                 for a in all_answers
-            ])
+            ]))
 
         else:
-            with open(file_path, "r", encoding="utf-8") as f:
-                file_text = f.read()
-
-            prompt = self._build_prompt() + "\n\nDateiinhalt:\n" + file_text
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "user", "content": prompt}
-                ]
-            )
-            return response.choices[0].message.content.strip()
-
-    def _build_prompt(self) -> str:
-        return (
-            "The uploaded file contains a scraped web application, test requirements, test URL and an example test.\n\n"
-            "1. Analyze only the currently attached file.\n"
-            "2. Ignore all previous prompts, contexts, or files.\n"
-            "3. Use only the TEST_URL specified in the file.\n"
-            "4. For each test requirement write an executable test and use the test example as the template.\n"
-            "5. Test functions must have descriptive names and be fully executable.\n"
-            "6. Respond only with Python code – no explanatory text.\n"
-            "7. At the very top of the code, include a comment line with the used URL, e.g., # URL used: https://...\n"
-            "8. Add a 5-second wait after each test to allow the web server to handle requests.\n"
-            "9. Make sure every test class name starts with Test that it can be processed from pytest \n"
+            return self.dispatcher.run(self.ask_with_file_async(file_path))
+
+    async def ask_with_file_async(self, file_path: str) -> str:
+        """Like ask_with_file, but runs concurrently with other requests of the dispatcher."""
+        if self.uses_assistant:
+            return await self.dispatcher.offload(self.ask_with_file, file_path)
+        key = self.cache_key(file_path)
+        cached = self._cached(key, file_path)
+        if cached is not None:
+            return cached
+        response = await self.dispatcher.chat(
+            self.async_client,
+            model=self.model,
+            messages=self.build_messages(file_path)
         )
+        return self._store(key, response.choices[0].message.content.strip())
+
+    def stream_with_file(self, file_path: str, on_text: Callable[[str], None]) -> str:
+        """Like ask_with_file, but ``on_text`` receives the answer while it is generated."""
+        return self.dispatcher.run(self.stream_with_file_async(file_path, on_text))
+
+    async def stream_with_file_async(self, file_path: str, on_text: Callable[[str], None]) -> str:
+        if self.uses_assistant:
+            # Assistant runs are not streamed token by token; the answer arrives in one piece
+            answer = await self.dispatcher.offload(self.ask_with_file, file_path)
+            on_text(answer)
+            return answer
+        key = self.cache_key(file_path)
+        cached = self._cached(key, file_path)
+        if cached is not None:
+            on_text(cached)
+            return cached
+        answer = await self.dispatcher.chat_stream(
+            self.async_client,
+            on_text,
+            model=self.model,
+            messages=self.build_messages(file_path)
+        )
+        return self._store(key, answer.strip())
+
+    def build_messages(self, file_path: str) -> list:
+        """Chat messages for one combined file (also used for Batch API requests)."""
+        with open(file_path, "r", encoding="utf-8") as f:
+            return test_generation_messages(f.read())
+
+    def cache_key(self, file_path: str) -> str:
+        return ResponseCache.file_key(self.model, test_generation_prefix(), file_path)
+
+    def ask_many(self, file_paths: List[str]) -> List:
+        """Answers for all files, generated concurrently. A failed file yields its exception."""
+        return self.dispatcher.map(self.ask_with_file_async, file_paths)
 
     def reset_state(self):
+        # Remote leftovers of an aborted run first, their ids are in uploads_path
+        self.cleanup()
         for file in ["thread_id.txt", "assistant_id.txt", "attached_file_ids.txt"]:
             if os.path.exists(file):
                 os.remove(file)
                 print(f"🗑️ {file} gelöscht.")
 
-    def generate_requirements_from_image(self, image_path: str) -> str:
+    def _image_prompt(self, image_paths: List[str]) -> str:
+        prompt = IMAGE_REQUIREMENTS_PROMPT
+        if len(image_paths) > 1:
+            prompt += (
+                f"\nThe screenshot is split into {len(image_paths)} consecutive vertical parts of the same page, "
+                "in order from top to bottom. Treat them as one page and do not repeat requirements.\n"
+            )
+        return prompt
+
+    def _image_key(self, image_paths: List[str]) -> str:
+        return ResponseCache.file_key(self.model, self._image_prompt(image_paths), *image_paths)
+
+    def generate_requirements_from_image(self, image_path) -> str:
+        """image_path may be a list of tiles of one tall page, top to bottom."""
         if not self.uses_assistant:
             raise NotImplementedError("Bildanalyse ist mit diesem Modell nicht verfügbar.")
 
-        file_id = self.upload_file_for_assistant(image_path)
-        thread = self.client.beta.threads.create()
-
-        prompt = (
-            "This is a screenshot of a web application interface.\n\n"
-            "Analyze the image carefully and generate clear, structured test requirements based on the visible UI.\n"
-            "Focus specifically on:\n"
-            "1. Testable user interactions (e.g., buttons, inputs, navigation elements)\n"
-            "2. Expected behavior for each element or user action\n"
-            "3. UI components relevant for functional or usability testing\n\n"
-            "Format your response as a numbered list of concise, natural-language test requirements.\n"
-            "- Do NOT write any code\n"
-            "- Avoid vague statements; be specific and practical\n"
-            "- Use clear wording suitable for QA or test case design\n"
-        )
+        image_paths = list(image_path) if isinstance(image_path, (list, tuple)) else [image_path]
+        key = self._image_key(image_paths)
+        cached = self._cached(key, image_paths[0])
+        if cached is not None:
+            return cached
+        file_ids = [self.upload_file_for_assistant(path) for path in image_paths]
+        thread = self._create_thread()
 
         self.client.beta.threads.messages.create(
             thread_id=thread.id,
             role="user",
-            content=[
-                {"type": "text", "text": prompt},
-                {"type": "image_file", "image_file": {"file_id": file_id}}
+            content=[{"type": "text", "text": self._image_prompt(image_paths)}] + [
+                {"type": "image_file", "image_file": {"file_id": file_id}} for file_id in file_ids
             ]
         )
 
-        run = self.client.beta.threads.runs.create(
-            thread_id=thread.id,
-            assistant_id=self.assistant_id
-        )
+        self._run_to_completion(thread.id)
 
-        while True:
-            run_status = self.client.beta.threads.runs.retrieve(
-                thread_id=thread.id,
-                run_id=run.id
-            )
-            if run_status.status == "completed":
-                break
-            elif run_status.status in ["failed", "cancelled", "expired"]:
-                raise Exception(f"Run fehlgeschlagen: {run_status.status}")
-            time.sleep(2)
+        answer = self._extract_assistant_response(thread.id)
+        return self._store(key, answer.strip())
+
+    def generate_requirements_from_images(self, pages: Dict[str, List[str]]) -> Dict[str, str]:
+        """Requirements for several screenshots in one run; ``pages`` maps a name to its tiles.
+
+        Answers are cached per page under the same key as single-image calls. Raises ValueError
+        if the answer is not a JSON object with requirements for every name.
+        """
+        if not self.uses_assistant:
+            raise NotImplementedError("Bildanalyse ist mit diesem Modell nicht verfügbar.")
+
+        results, todo = {}, {}
+        for name, tiles in pages.items():
+            cached = self._cached(self._image_key(tiles), tiles[0])
+            if cached is not None:
+                results[name] = cached
+            else:
+                todo[name] = tiles
+        if not todo:
+            return results
+
+        content = [{"type": "text", "text": IMAGE_REQUIREMENTS_BATCH_PROMPT + json.dumps(list(todo))}]
+        for name, tiles in todo.items():
+            label = f"Screenshot {json.dumps(name)}"
+            if len(tiles) > 1:
+                label += f" ({len(tiles)} consecutive parts, top to bottom)"
+            content.append({"type": "text", "text": label})
+            content += [{"type": "image_file", "image_file": {"file_id": self.upload_file_for_assistant(path)}}
+                        for path in tiles]
+        thread = self._create_thread()
+        self.client.beta.threads.messages.create(thread_id=thread.id, role="user", content=content)
+        self._run_to_completion(thread.id)
 
         answer = self._extract_assistant_response(thread.id)
-        return answer.strip()
+        parsed = self._parse_json_object(answer)
+        for name, tiles in todo.items():
+            value = parsed.get(name)
+            if isinstance(value, list):
+                value = "\n".join(f"{i}. {item}" for i, item in enumerate(value, 1))
+            if not isinstance(value, str) or not value.strip():
+                raise ValueError(f"Keine Anforderungen für {name} in der Batch-Antwort.")
+            results[name] = self._store(self._image_key(tiles), value.strip())
+        return results
+
+    @staticmethod
+    def _parse_json_object(answer: str) -> dict:
+        match = re.search(r"```(?:json)?\s*(.*?)```", answer, re.DOTALL)
+        text = match.group(1) if match else answer[answer.find("{"):answer.rfind("}") + 1]
+        try:
+            parsed = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise ValueError(f"Batch-Antwort ist kein JSON: {e}") from e
+        if not isinstance(parsed, dict):
+            raise ValueError("Batch-Antwort ist kein JSON-Objekt.")
+        return parsed
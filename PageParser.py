@@ -0,0 +1,112 @@
+import importlib.util
+import warnings
+from typing import List, Optional, Set
+from urllib.parse import urljoin
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4 import XMLParsedAsHTMLWarning
+
+from UrlCanonicalizer import canonical_netloc
+
+# Fastest first; html.parser ships with Python and is always available.
+PARSER_BACKENDS = ("lxml", "html.parser")
+
+
+def resolve_parser(preferred: Optional[str] = None) -> str:
+    """Pick the BeautifulSoup backend: ``preferred`` if usable, otherwise the fastest installed one."""
+    candidates = (preferred,) + PARSER_BACKENDS if preferred else PARSER_BACKENDS
+    for backend in candidates:
+        if backend == "html.parser" or importlib.util.find_spec(backend) is not None:
+            return backend
+    return "html.parser"
+
+
+def extract_links(soup: BeautifulSoup, current_url: str, base_domain: str) -> Set[str]:
+    """Same-domain links, resolved like a browser: against <base href> if present, else ``current_url``
+    (which should be the URL the page was actually served from, after redirects)."""
+    base = soup.find('base', href=True)
+    if base is not None:
+        current_url = urljoin(current_url, base['href'])
+    links = set()
+    for a_tag in soup.find_all('a', href=True):
+        full_url = urljoin(current_url, a_tag['href'])
+        if full_url.startswith(('http://', 'https://')) and canonical_netloc(full_url) == base_domain:
+            links.add(full_url)
+    return links
+
+
+def read_title(html: str, parser: Optional[str] = None) -> str:
+    """Read only the <title> element without building the full document tree."""
+    warnings.filterwarnings("ignore", category=XMLParsedAsHTMLWarning)
+    soup = BeautifulSoup(html, resolve_parser(parser), parse_only=SoupStrainer("title"))
+    title = soup.find("title")
+    return title.string if title and title.string else ""
+
+
+class ParsedPage:
+    """One parse per page, shared by content validation and link extraction.
+
+    ``url`` is the page's crawl key; ``base_url`` is the URL the response came from (after redirects),
+    which relative links are resolved against. It defaults to ``url``.
+    """
+
+    def __init__(self, html: str, url: str, parser: Optional[str] = None, base_url: Optional[str] = None):
+        self.html = html
+        self.url = url
+        self.base_url = base_url or url
+        self.parser = resolve_parser(parser)
+        self.soup = BeautifulSoup(html, self.parser)
+        self._text = None
+
+    @property
+    def text(self) -> str:
+        if self._text is None:
+            self._text = self.soup.get_text(separator=" ", strip=True)
+        return self._text
+
+    @property
+    def title(self) -> str:
+        soup = self.soup
+        return soup.title.string.strip() if soup.title and soup.title.string else ""
+
+    def links(self, base_domain: str) -> Set[str]:
+        return extract_links(self.soup, self.base_url, base_domain)
+
+    @property
+    def interactive_elements(self) -> int:
+        """Number of forms and form controls, a rough measure of how much there is to test."""
+        return len(self.soup.find_all(["form", "input", "button", "select", "textarea"]))
+
+    @property
+    def form_fields(self) -> List[str]:
+        """One entry per form control (tag, type, name, label or button text), in page order."""
+        labels = {label["for"]: label.get_text(" ", strip=True) for label in self.soup.find_all("label", attrs={"for": True})}
+        fields = []
+        for control in self.soup.find_all(["input", "button", "select", "textarea"]):
+            label = labels.get(control.get("id"), "") or control.get("placeholder", "") or control.get_text(" ", strip=True)
+            fields.append(":".join([control.name, control.get("type", ""), control.get("name", ""), label]))
+        return fields
+
+    def page_info(self) -> dict:
+        """Summarize the page. Raises ValueError if title or text is missing."""
+        soup = self.soup
+        title = self.title
+        meta_desc = ""
+        meta = soup.find("meta", attrs={"name": "description"})
+        if meta and meta.get("content"):
+            meta_desc = meta["content"].strip()
+        headings = {tag: [h.get_text(strip=True) for h in soup.find_all(tag)] for tag in ["h1", "h2", "h3"]}
+        links = [a['href'] for a in soup.find_all('a', href=True)]
+        images = [{"src": img.get("src"), "alt": img.get("alt", "")} for img in soup.find_all("img")]
+        text = self.text
+        if not title or not text:
+            raise ValueError(f"Critical information missing for {self.url}: title or text not found.")
+        return {
+            "url": self.url,
+            "title": title,
+            "meta_description": meta_desc,
+            "headings": headings,
+            "links": links,
+            "images": images,
+            "text": text
+        }
@@ -0,0 +1,153 @@
+import gzip
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # optional, gzip is used when zstandard is not installed
+    zstandard = None
+
+from GeneratePagePictures import screenshot_filename
+from TestUtils import TestUtils
+
+
+class PageStore:
+    """Content-addressed, compressed store for scraped pages with an indexed URL manifest.
+
+    Bodies are deduplicated by SHA-256 and written once to ``blobs/<ab>/<cd>/<hash>.html.<codec>``.
+    ``manifest.sqlite`` maps each canonical URL to its blob and metadata, and also indexes
+    the screenshot-derived page key so later stages can go from a requirement file to its URL
+    without reverse-engineering file names.
+    """
+
+    def __init__(self, root, codec: Optional[str] = None):
+        self.root = Path(root)
+        self.blob_dir = self.root / "blobs"
+        self.blob_dir.mkdir(parents=True, exist_ok=True)
+        self.codec = codec or ("zst" if zstandard is not None else "gz")
+        if self.codec == "zst" and zstandard is None:
+            raise ValueError("zstd compression requires the 'zstandard' package.")
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(str(self.root / "manifest.sqlite"), check_same_thread=False)
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS pages (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                codec TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                title TEXT,
+                page_key TEXT,
+                screenshot_name TEXT,
+                stored_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_pages_key ON pages (page_key);
+            CREATE INDEX IF NOT EXISTS idx_pages_hash ON pages (content_hash);
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def page_key(url: str) -> str:
+        """Key shared by screenshots, image requirements, combined files and tests of one page."""
+        return TestUtils.normalize_name(screenshot_filename(url))
+
+    def _blob_path(self, content_hash: str, codec: str) -> Path:
+        return self.blob_dir / content_hash[:2] / content_hash[2:4] / f"{content_hash}.html.{codec}"
+
+    def _compress(self, data: bytes, codec: str) -> bytes:
+        if codec == "zst":
+            return zstandard.ZstdCompressor(level=10).compress(data)
+        return gzip.compress(data, compresslevel=6)
+
+    def _decompress(self, data: bytes, codec: str) -> bytes:
+        if codec == "zst":
+            if zstandard is None:
+                raise ValueError("Reading zstd blobs requires the 'zstandard' package.")
+            return zstandard.ZstdDecompressor().decompress(data)
+        return gzip.decompress(data)
+
+    def put(self, url: str, html: str, title: str = "") -> str:
+        """Store ``html`` for ``url`` and return its content hash. Identical bodies share one blob."""
+        data = html.encode("utf-8")
+        content_hash = hashlib.sha256(data).hexdigest()
+        with self._lock:
+            return self._put(url, data, content_hash, title)
+
+    def _put(self, url: str, data: bytes, content_hash: str, title: str) -> str:
+        row = self.conn.execute(
+            "SELECT codec, stored_size FROM pages WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        if row is not None and self._blob_path(content_hash, row[0]).exists():
+            codec, stored_size = row
+        else:
+            codec = self.codec
+            path = self._blob_path(content_hash, codec)
+            if not path.exists():
+                path.parent.mkdir(parents=True, exist_ok=True)
+                tmp = path.with_suffix(path.suffix + f".{os.getpid()}.tmp")
+                tmp.write_bytes(self._compress(data, codec))
+                os.replace(tmp, path)
+            stored_size = path.stat().st_size
+        self.conn.execute(
+            "INSERT OR REPLACE INTO pages (url, content_hash, codec, size, stored_size, title, page_key, "
+            "screenshot_name, stored_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+            (url, content_hash, codec, len(data), stored_size, title, self.page_key(url),
+             screenshot_filename(url), time.time()),
+        )
+        self.conn.commit()
+        return content_hash
+
+    def has(self, url: str) -> bool:
+        with self._lock:
+            return self.conn.execute("SELECT 1 FROM pages WHERE url = ?", (url,)).fetchone() is not None
+
+    def lookup(self, url: str) -> Optional[dict]:
+        return self._entry("SELECT * FROM pages WHERE url = ?", url)
+
+    def find_by_key(self, page_key: str) -> Optional[dict]:
+        return self._entry("SELECT * FROM pages WHERE page_key = ?", page_key)
+
+    def _entry(self, query: str, value: str) -> Optional[dict]:
+        with self._lock:
+            cursor = self.conn.execute(query, (value,))
+            row = cursor.fetchone()
+            if row is None:
+                return None
+            return dict(zip([c[0] for c in cursor.description], row))
+
+    def get(self, url: str) -> Optional[str]:
+        entry = self.lookup(url)
+        if entry is None:
+            return None
+        data = self._blob_path(entry["content_hash"], entry["codec"]).read_bytes()
+        return self._decompress(data, entry["codec"]).decode("utf-8")
+
+    def entries(self) -> Iterator[dict]:
+        with self._lock:
+            cursor = self.conn.execute("SELECT * FROM pages ORDER BY url")
+            columns = [c[0] for c in cursor.description]
+            rows = cursor.fetchall()
+        for row in rows:
+            yield dict(zip(columns, row))
+
+    def stats(self) -> dict:
+        with self._lock:
+            return self._stats()
+
+    def _stats(self) -> dict:
+        pages, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM pages").fetchone()
+        blobs, stored = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(stored_size), 0) FROM "
+            "(SELECT content_hash, MAX(stored_size) AS stored_size FROM pages GROUP BY content_hash)"
+        ).fetchone()
+        return {"pages": pages, "blobs": blobs, "raw_bytes": size, "stored_bytes": stored}
+
+    def close(self) -> None:
+        self.conn.close()
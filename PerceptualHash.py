@@ -0,0 +1,104 @@
+import difflib
+import os
+import threading
+from typing import Dict, List, Optional
+
+try:
+    from PIL import Image
+except ImportError:  # optional, screenshot dedup is skipped without Pillow
+    Image = None
+
+# 16x16 dHash: 8x8 cannot tell mostly-white form pages with a shared header apart
+HASH_SIZE = 16
+# Max differing bits (of 256) for two screenshots to count as the same page
+DEFAULT_THRESHOLD = 10
+
+
+def dhash(image_path: str, hash_size: int = HASH_SIZE) -> int:
+    """Difference hash: compares neighbouring pixels of a small greyscale thumbnail."""
+    with Image.open(image_path) as img:
+        # Full-page screenshots vary in height; the top viewport carries the page template
+        width, height = img.size
+        if height > width * 2:
+            img = img.crop((0, 0, width, width * 2))
+        small = img.convert("L").resize((hash_size + 1, hash_size), Image.LANCZOS)
+        pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        for col in range(hash_size):
+            left = pixels[row * (hash_size + 1) + col]
+            right = pixels[row * (hash_size + 1) + col + 1]
+            value = value << 1 | (left > right)
+    return value
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def text_similarity(a: str, b: str) -> float:
+    """Word-level similarity of two page texts (1.0 = identical)."""
+    matcher = difflib.SequenceMatcher(None, a.split(), b.split(), autojunk=False)
+    return matcher.ratio() if matcher.quick_ratio() else 0.0
+
+
+def cluster_images(image_folder: str, image_files: List[str], threshold: Optional[int]) -> Dict[str, List[str]]:
+    """Group visually near-identical screenshots.
+
+    Returns ``{representative: [representative, *duplicates]}``. Every image is its own cluster
+    when ``threshold`` is None or Pillow is not installed.
+    """
+    if threshold is None or Image is None:
+        return {f: [f] for f in image_files}
+    clusters: Dict[str, List[str]] = {}
+    hashes: Dict[str, int] = {}
+    for image_file in sorted(image_files):
+        try:
+            value = dhash(os.path.join(image_folder, image_file))
+        except OSError as e:
+            print(f"⚠️ Could not hash {image_file}: {e}")
+            clusters[image_file] = [image_file]
+            continue
+        match = next((rep for rep, h in hashes.items() if hamming_distance(value, h) <= threshold), None)
+        if match is None:
+            hashes[image_file] = value
+            clusters[image_file] = [image_file]
+        else:
+            clusters[match].append(image_file)
+    return clusters
+
+
+class ImageClusterIndex:
+    """Incremental version of ``cluster_images`` for screenshots that arrive one at a time.
+
+    When page texts are given, a visual match only counts if the texts are at least
+    ``min_text_similarity`` alike: pages that look the same can still have different fields.
+    """
+
+    def __init__(self, threshold: Optional[int], min_text_similarity: float = 0.97):
+        self.threshold = threshold
+        self.min_text_similarity = min_text_similarity
+        self._hashes: Dict[str, int] = {}
+        self._texts: Dict[str, Optional[str]] = {}
+        self._lock = threading.Lock()
+
+    def _same_text(self, rep: str, text: Optional[str]) -> bool:
+        other = self._texts.get(rep)
+        return text is None or other is None or text_similarity(text, other) >= self.min_text_similarity
+
+    def add(self, name: str, image_path: str, text: Optional[str] = None) -> Optional[str]:
+        """Return the representative ``name`` duplicates, or None if it starts a new cluster."""
+        if self.threshold is None or Image is None:
+            return None
+        try:
+            value = dhash(image_path)
+        except OSError as e:
+            print(f"⚠️ Could not hash {os.path.basename(image_path)}: {e}")
+            return None
+        with self._lock:
+            match = next((rep for rep, h in self._hashes.items()
+                          if hamming_distance(value, h) <= self.threshold and self._same_text(rep, text)), None)
+            if match is None:
+                self._hashes[name] = value
+                self._texts[name] = text
+            return match
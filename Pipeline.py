@@ -0,0 +1,361 @@
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional
+
+from GeneratePagePictures import screenshot_filename
+from HtmlReducer import HtmlReducer
+from ModelCascade import ModelCascade
+from PageStore import PageStore
+from PageParser import ParsedPage
+from PerceptualHash import DEFAULT_THRESHOLD, ImageClusterIndex
+from ScreenshotProcessor import ScreenshotProcessor, estimate_image_tokens
+from StreamingTestWriter import StreamingTestWriter
+from ChunkedGenerator import ChunkedGenerator
+from TestUtils import TestUtils, ImageRequirementProcessor, RequirementCombiner, extract_test_code
+
+_DONE = object()
+
+
+def test_path(tests_dir, combined_file) -> Path:
+    """tests/test_<combined name>.py for a combined requirements file."""
+    return Path(tests_dir) / Path(f"test_{os.path.basename(str(combined_file))}").with_suffix(".py")
+
+
+class _Stage:
+    def __init__(self, name: str, func: Callable, workers: int, queue_size: int,
+                 batch_fits: Optional[Callable[[list], bool]] = None, batch_wait: float = 0.0):
+        self.name = name
+        self.func = func
+        self.workers = max(1, workers)
+        # Batch stages get a list of items: as many as batch_fits() allows, collected for up to batch_wait seconds
+        self.batch_fits = batch_fits
+        self.batch_wait = batch_wait
+        self.queue: queue.Queue = queue.Queue(maxsize=queue_size)
+        self.threads: List[threading.Thread] = []
+        self.running = self.workers
+        self.processed = 0
+        self.failed = 0
+        self.lock = threading.Lock()
+
+
+class StreamingPipeline:
+    """Stages connected by bounded queues, each with its own worker threads.
+
+    An item moves on as soon as a stage has finished it. A full queue blocks the stage in
+    front of it (back-pressure). A stage function returns the item for the next stage,
+    or None to drop it. A batch stage (``batch_fits``) receives a list of the items that
+    arrive within ``batch_wait`` seconds and returns a list of results.
+    """
+
+    def __init__(self, queue_size: int = 8):
+        self.queue_size = queue_size
+        self.stages: List[_Stage] = []
+
+    def add_stage(self, name: str, func: Callable, workers: int = 1,
+                  batch_fits: Optional[Callable[[list], bool]] = None, batch_wait: float = 0.5):
+        self.stages.append(_Stage(name, func, workers, self.queue_size, batch_fits, batch_wait))
+        return self
+
+    def start(self):
+        for index, stage in enumerate(self.stages):
+            for worker in range(stage.workers):
+                thread = threading.Thread(target=self._run, args=(index,), name=f"{stage.name}-{worker}", daemon=True)
+                thread.start()
+                stage.threads.append(thread)
+        return self
+
+    def submit(self, item) -> None:
+        self.stages[0].queue.put(item)
+
+    def close(self) -> None:
+        """No more items follow: wait until every stage has drained."""
+        first = self.stages[0]
+        for _ in range(first.workers):
+            first.queue.put(_DONE)
+        for stage in self.stages:
+            for thread in stage.threads:
+                thread.join()
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {stage.name: {"processed": stage.processed, "failed": stage.failed} for stage in self.stages}
+
+    def _run(self, index: int) -> None:
+        stage = self.stages[index]
+        following = self.stages[index + 1] if index + 1 < len(self.stages) else None
+        carry = None
+        while True:
+            item = carry if carry is not None else stage.queue.get()
+            carry = None
+            if item is _DONE:
+                break
+            if stage.batch_fits is None:
+                items, results = [item], self._call(stage, item, 1)
+                results = None if results is None else [results]
+            else:
+                items, carry = self._collect(stage, item)
+                results = self._call(stage, items, len(items))
+            for result in results or []:
+                if result is not None and following is not None:
+                    following.queue.put(result)
+        with stage.lock:
+            stage.running -= 1
+            last = stage.running == 0
+        # The last worker of a stage closes the next one
+        if last and following is not None:
+            for _ in range(following.workers):
+                following.queue.put(_DONE)
+
+    def _call(self, stage: _Stage, argument, count: int):
+        try:
+            result = stage.func(argument)
+        except Exception as e:
+            with stage.lock:
+                stage.failed += count
+            print(f"❌ Stage '{stage.name}' failed: {e}")
+            return None
+        with stage.lock:
+            stage.processed += count
+        return result
+
+    def _collect(self, stage: _Stage, first):
+        """Items for one batch, starting with ``first``. Returns (items, carried over item or None);
+        the carried item did not fit (or is the end marker) and starts the worker's next round."""
+        items = [first]
+        deadline = time.monotonic() + stage.batch_wait
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                item = stage.queue.get(timeout=remaining) if remaining > 0 else stage.queue.get_nowait()
+            except queue.Empty:
+                return items, None
+            if item is _DONE or not stage.batch_fits(items + [item]):
+                return items, item
+            items.append(item)
+
+
+class TestGenerationPipeline:
+    """Moves every crawled page through screenshot processing, image requirements, combining,
+    test generation and validation as soon as the crawler has stored it.
+
+    Pass ``submit_page`` as ``on_page`` to ``RecursiveWebScraper.start_scraping`` (async or rendered mode).
+    With ``generate=False`` the pipeline stops after combining and collects the files that need
+    a (new) test in ``pending``, e.g. for BatchGenerator.
+    """
+
+    def __init__(self, base_path, bot, image_bot, page_store: PageStore, queue_size: int = 8,
+                 image_workers: int = 2, requirement_workers: int = 2, combine_workers: int = 1,
+                 generate_workers: int = 4, validate_workers: int = 2, dedup_threshold=DEFAULT_THRESHOLD, generate: bool = True,
+                 reducer: Optional[HtmlReducer] = None, chunk_tokens: Optional[int] = 8000, stream: bool = True,
+                 cascade: Optional[ModelCascade] = None, max_images: int = 8, max_image_tokens: int = 8000,
+                 image_batch_wait: float = 0.5):
+        self.base_path = Path(base_path)
+        self.bot = bot
+        self.image_bot = image_bot
+        self.page_store = page_store
+        self.processor = ScreenshotProcessor()
+        self.clusters = ImageClusterIndex(dedup_threshold)
+        # Screenshots arriving close together share one image requirements run (max_images=1 disables it)
+        self.max_images = max_images
+        self.max_image_tokens = max_image_tokens
+        # Combined files above chunk_tokens are generated in parts and merged (one generator per connector);
+        # None sends every file in one prompt
+        self.chunk_tokens = chunk_tokens
+        # Prompts get an outline of the page instead of the raw HTML. It is only cut to a token budget
+        # when nothing chunks it (no chunk_tokens, or generate=False, e.g. for BatchGenerator);
+        # otherwise large pages are split by ChunkedGenerator instead of truncated.
+        chunking = generate and chunk_tokens is not None
+        if reducer is None:
+            reducer = HtmlReducer(max_tokens=None) if chunking else HtmlReducer()
+        elif chunking and reducer.max_tokens is not None and reducer.max_tokens <= chunk_tokens:
+            print(f"⚠️ HtmlReducer max_tokens={reducer.max_tokens} cuts pages before chunk_tokens={chunk_tokens} "
+                  f"can split them; use max_tokens=None to keep whole pages.")
+        self.reducer = reducer
+        self._generators: Dict[int, ChunkedGenerator] = {}
+        # Cheap model first, stronger ones only when the test fails the checks
+        self.cascade = cascade
+        # Stream answers and write each test as soon as it is complete
+        self.stream = stream
+        self._finished: Dict[str, threading.Event] = {}
+        self._finished_lock = threading.Lock()
+        self.results: Dict[str, bool] = {}
+        self.pending: List[str] = []
+        for folder in ("upload_images", "image_requirements", "combined_requirements", "tests"):
+            (self.base_path / folder).mkdir(parents=True, exist_ok=True)
+        self.pipeline = (
+            StreamingPipeline(queue_size)
+            .add_stage("screenshots", self.prepare_screenshot, image_workers)
+            .add_stage("image requirements", self.image_requirements, requirement_workers,
+                       batch_fits=self._fits_image_batch, batch_wait=image_batch_wait)
+            .add_stage("combine", self.combine, combine_workers)
+        )
+        if generate:
+            self.pipeline.add_stage("generate", self.generate, generate_workers)
+            self.pipeline.add_stage("validate", self.validate, validate_workers)
+
+    def start(self):
+        self.pipeline.start()
+        return self
+
+    def submit_page(self, url: str, changed: bool) -> None:
+        self.pipeline.submit({"url": url, "changed": changed, "key": PageStore.page_key(url)})
+
+    def close(self) -> Dict[str, Dict[str, int]]:
+        self.pipeline.close()
+        return self.pipeline.stats()
+
+    def _unchanged(self, job) -> set:
+        # Same semantics as the batch stages: only unchanged pages may reuse earlier outputs
+        return set() if job["changed"] else {job["key"]}
+
+    def prepare_screenshot(self, job):
+        name = os.path.splitext(screenshot_filename(job["url"]))[0]
+        source = self.base_path / "images" / screenshot_filename(job["url"])
+        if not source.exists():
+            print(f"⚠️ No screenshot for {job['url']}, skipping test generation.")
+            return None
+        job["image_file"] = name
+        job["tiles"] = self.processor.process(str(source), self.base_path / "upload_images")
+        return job
+
+    def _fits_image_batch(self, jobs) -> bool:
+        images, tokens = 0, 0
+        for job in jobs:
+            if "image_tokens" not in job:
+                job["image_tokens"] = sum(estimate_image_tokens(t) for t in job["tiles"])
+            images += len(job["tiles"])
+            tokens += job["image_tokens"]
+        return images <= self.max_images and tokens <= self.max_image_tokens
+
+    def image_requirements(self, jobs):
+        """Requirements for a batch of pages. Pages that need a new analysis go to the image model in
+        one run; visually identical pages reuse the requirements of the page they duplicate."""
+        output_dir = self.base_path / "image_requirements"
+        with self._finished_lock:
+            finished = {job["image_file"]: self._finished.setdefault(job["image_file"], threading.Event())
+                        for job in jobs}
+        try:
+            own, duplicates = [], []
+            for job in jobs:
+                original = self.clusters.add(job["image_file"], job["tiles"][0], self._page_text(job))
+                (own if original is None else duplicates).append((job, original))
+            self._analyse_pages([job for job, _ in own], output_dir)
+            for job, _ in own:
+                finished[job["image_file"]].set()
+            for job, original in duplicates:
+                # Wait for the visually identical page and reuse its requirements
+                self._finished[original].wait()
+                original_path = output_dir / (original + ".txt")
+                if original_path.exists():
+                    ImageRequirementProcessor._share_result(str(original_path), str(output_dir), [job["image_file"]])
+                    job["requirements"] = job["image_file"] + ".txt"
+                else:
+                    self._analyse_pages([job], output_dir)
+                finished[job["image_file"]].set()
+        finally:
+            for event in finished.values():
+                event.set()
+        return [job if "requirements" in job else None for job in jobs]
+
+    def _page_text(self, job) -> Optional[str]:
+        """Form fields of the page (its text if it has none), so screenshots that merely look alike
+        do not share requirements. Navigation text would hide a few changed labels."""
+        html = self.page_store.get(job["url"])
+        if not html:
+            return None
+        page = ParsedPage(html, job["url"])
+        return " ".join(page.form_fields) or page.text
+
+    def _analyse_pages(self, jobs, output_dir) -> None:
+        """Set job["requirements"] for every page whose requirements exist or could be generated."""
+        todo = {}
+        for job in jobs:
+            name = job["image_file"]
+            if ImageRequirementProcessor._needs_processing(name, str(output_dir), self._unchanged(job)):
+                todo[name] = job
+            else:
+                job["requirements"] = name + ".txt"
+        written = {}
+        if len(todo) > 1 and hasattr(self.image_bot, "generate_requirements_from_images"):
+            written = ImageRequirementProcessor.process_batch(
+                self.image_bot, {name: job["tiles"] for name, job in todo.items()}, str(output_dir))
+        for name, job in todo.items():
+            # Pages the batch could not answer are analysed one by one
+            output_path = written.get(name) or ImageRequirementProcessor.process_page(
+                self.image_bot, name, job["tiles"], str(output_dir), self._unchanged(job))
+            if output_path is not None:
+                job["requirements"] = os.path.basename(output_path)
+
+    def combine(self, job):
+        output_path = RequirementCombiner.combine_file(
+            job["requirements"], self.base_path / "image_requirements", self.base_path / "scraped_pages",
+            self.base_path / "combined_requirements", self._unchanged(job), self.page_store, self.reducer,
+            url=job["url"])
+        if output_path is None:
+            return None
+        job["combined"] = output_path
+        if job["changed"] or not test_path(self.base_path / "tests", output_path).exists():
+            self.pending.append(output_path)
+        return job
+
+    def generate(self, job):
+        file_data = os.path.basename(job["combined"])
+        test_output_file = test_path(self.base_path / "tests", job["combined"])
+        job["test"] = test_output_file
+        if not job["changed"] and test_output_file.exists():
+            print(f"⏩ Skipping {file_data} – page unchanged since the last run.")
+            return None
+
+        print(f" Asking bot with {file_data}...")
+        if self.cascade is not None:
+            decision = self.cascade.generate(job["combined"], test_output_file, self._write_test)
+            last = decision["attempts"][-1]
+            if "runnable" not in last:
+                print(f"❌ Error with file {file_data}: {last.get('error', 'no response')}")
+                return None
+            # Already checked by the cascade, validate() does not run pytest again
+            job["runnable"] = last["runnable"]
+            print(f"💾 Test saved in: {test_output_file} ({decision['model']}, {decision['seconds']}s)\n")
+            return job
+        try:
+            if not self._write_test(self.bot, job["combined"], test_output_file):
+                print(f"⚠️ No response received for file {file_data}.")
+                return None
+        except Exception as e:
+            print(f"❌ Error with file {file_data}: {e}")
+            return None
+        print(f"✅ Response received for file {file_data}.")
+        print(f"💾 Test saved in: {test_output_file}\n")
+        return job
+
+    def _write_test(self, bot, combined_file, test_output_file) -> bool:
+        """Generate the test for ``combined_file`` with ``bot``. False if the answer was empty."""
+        generator = None
+        if self.chunk_tokens is not None:
+            generator = self._generators.setdefault(id(bot), ChunkedGenerator(bot, max_tokens=self.chunk_tokens))
+        if self.stream and hasattr(bot, "stream_with_file") and (generator is None or not generator.needs_chunks(combined_file)):
+            # Tests are written to disk one by one while the answer streams in
+            writer = StreamingTestWriter(test_output_file)
+            try:
+                bot.stream_with_file(combined_file, writer.feed)
+            except Exception:
+                writer.abort()
+                raise
+            return bool(writer.close())
+        response = (generator or bot).ask_with_file(combined_file)
+        if not response.strip():
+            return False
+        with open(test_output_file, "w", encoding="utf-8") as f:
+            f.write(extract_test_code(response))
+        return True
+
+    def validate(self, job):
+        runnable = job.get("runnable")
+        if runnable is None:
+            runnable = TestUtils.is_test_runnable(job["test"])
+        self.results[str(job["test"])] = runnable
+        if not runnable:
+            print(f"⚠️ Generated test is not runnable: {job['test']}")
+        return job
@@ -0,0 +1,75 @@
+import functools
+from typing import List
+
+EXAMPLE_TEST_PATH = "exampleTest.txt"
+
+SYSTEM_INSTRUCTIONS = (
+    "You are an experienced developer. Analyze the provided input, which includes a scraped website, "
+    "manual test cases and the TEST_URL. From this, identify testable features and generate Playwright "
+    "tests compatible with pytest. Use only the TEST_URL given in the input.\n"
+)
+
+OUTPUT_RULES = (
+    "1. Analyze only the current input (the page data after these instructions or the attached file).\n"
+    "2. Ignore all previous prompts, contexts, or files.\n"
+    "3. Use only the TEST_URL specified in the input.\n"
+    "4. For each test requirement write an executable test and use the test example below as the template.\n"
+    "5. Test functions must have descriptive names and be fully executable.\n"
+    "6. Respond only with Python code – no explanatory text.\n"
+    "7. At the very top of the code, include a comment line with the used URL, e.g., # URL used: https://...\n"
+    "8. Add a 5-second wait after each test to allow the web server to handle requests.\n"
+    "9. Make sure every test class name starts with Test that it can be processed from pytest \n"
+)
+
+IMAGE_REQUIREMENTS_RULES = (
+    "Analyze the image carefully and generate clear, structured test requirements based on the visible UI.\n"
+    "Focus specifically on:\n"
+    "1. Testable user interactions (e.g., buttons, inputs, navigation elements)\n"
+    "2. Expected behavior for each element or user action\n"
+    "3. UI components relevant for functional or usability testing\n\n"
+    "Format your response as a numbered list of concise, natural-language test requirements.\n"
+    "- Do NOT write any code\n"
+    "- Avoid vague statements; be specific and practical\n"
+    "- Use clear wording suitable for QA or test case design\n"
+)
+
+IMAGE_REQUIREMENTS_PROMPT = "This is a screenshot of a web application interface.\n\n" + IMAGE_REQUIREMENTS_RULES
+
+IMAGE_REQUIREMENTS_BATCH_PROMPT = (
+    "These are screenshots of several pages of a web application interface. Each screenshot is introduced "
+    "by a line with its name; a screenshot split into consecutive vertical parts is one page.\n\n"
+    "For every screenshot separately:\n"
+    + IMAGE_REQUIREMENTS_RULES +
+    "\nRespond only with a JSON object that maps every screenshot name, exactly as given, to its numbered "
+    "list of requirements as a single string. Screenshot names: "
+)
+
+
+@functools.lru_cache(maxsize=None)
+def example_test(path: str = EXAMPLE_TEST_PATH) -> str:
+    """The example test, read once per process."""
+    with open(path, "r", encoding="utf-8") as f:
+        return f.read()
+
+
+@functools.lru_cache(maxsize=None)
+def test_generation_prefix(example_path: str = EXAMPLE_TEST_PATH) -> str:
+    """Static part of every test generation prompt: instructions, output rules and the example test.
+
+    It is byte-identical for all pages and always comes first, so the providers' automatic prompt
+    caching can reuse it; only the page data that follows differs between requests.
+    """
+    return (
+        f"{SYSTEM_INSTRUCTIONS}\n"
+        f"{OUTPUT_RULES}\n"
+        f"### Use the following test as a template\n\n"
+        f"{example_test(example_path)}\n"
+    )
+
+
+def test_generation_messages(page_data: str) -> List[dict]:
+    """Chat messages: the shared prefix as system message, the combined page data last."""
+    return [
+        {"role": "system", "content": test_generation_prefix()},
+        {"role": "user", "content": page_data},
+    ]
@@ -0,0 +1,108 @@
+import asyncio
+import email.utils
+import threading
+import time
+from typing import Dict, Optional
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """Return the Retry-After header as seconds (accepts delta-seconds and HTTP dates)."""
+    if not value:
+        return None
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    return max(0.0, retry_at.timestamp() - time.time())
+
+
+class _HostBucket:
+    def __init__(self, rate: float, burst: float, max_rate: float):
+        self.rate = rate
+        self.max_rate = max_rate
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self.blocked_until = 0.0
+
+
+class AdaptiveRateLimiter:
+    """Token bucket per host whose rate adapts AIMD-style to the server's responses.
+
+    Every successful response raises the host's rate by ``increase`` requests/second,
+    a 429/503 multiplies it by ``decrease`` and blocks the host for ``Retry-After`` seconds.
+    """
+
+    THROTTLE_STATUS = {429, 503}
+
+    def __init__(self, initial_rate: float = 2.0, min_rate: float = 0.2, max_rate: float = 20.0,
+                 burst: float = 1.0, increase: float = 0.1, decrease: float = 0.5):
+        self.initial_rate = initial_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.increase = increase
+        self.decrease = decrease
+        self._buckets: Dict[str, _HostBucket] = {}
+        self._lock = threading.Lock()
+
+    def _bucket(self, host: str) -> _HostBucket:
+        bucket = self._buckets.get(host)
+        if bucket is None:
+            bucket = self._buckets[host] = _HostBucket(self.initial_rate, self.burst, self.max_rate)
+        return bucket
+
+    def reserve(self, host: str) -> float:
+        """Take one token for ``host`` and return how long the caller has to wait before sending."""
+        with self._lock:
+            bucket = self._bucket(host)
+            now = time.monotonic()
+            bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) * bucket.rate)
+            bucket.updated = now
+            bucket.tokens -= 1.0
+            wait = 0.0 if bucket.tokens >= 0 else -bucket.tokens / bucket.rate
+            return max(wait, bucket.blocked_until - now)
+
+    def acquire(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait > 0:
+            time.sleep(wait)
+
+    async def acquire_async(self, host: str) -> None:
+        wait = self.reserve(host)
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+    def on_response(self, host: str, status_code: int, retry_after: Optional[str] = None) -> float:
+        """Adapt the host's rate to a response. Returns the back-off in seconds (0 if not throttled)."""
+        with self._lock:
+            bucket = self._bucket(host)
+            if status_code not in self.THROTTLE_STATUS:
+                bucket.rate = min(bucket.max_rate, bucket.rate + self.increase)
+                return 0.0
+            bucket.rate = min(bucket.max_rate, max(self.min_rate, bucket.rate * self.decrease))
+            delay = parse_retry_after(retry_after)
+            if delay is None:
+                delay = 1.0 / bucket.rate
+            bucket.blocked_until = max(bucket.blocked_until, time.monotonic() + delay)
+            return delay
+
+    def set_rate(self, host: str, rate: float) -> None:
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.rate = min(bucket.max_rate, max(self.min_rate, rate))
+
+    def cap_rate(self, host: str, max_rate: float) -> None:
+        """Never exceed ``max_rate`` for ``host``, e.g. derived from a robots.txt Crawl-delay."""
+        with self._lock:
+            bucket = self._bucket(host)
+            bucket.max_rate = max_rate
+            bucket.rate = min(bucket.rate, max_rate)
+
+    def rate(self, host: str) -> float:
+        with self._lock:
+            return self._bucket(host).rate
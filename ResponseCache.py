@@ -0,0 +1,121 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional
+
+
+class ResponseCache:
+    """On-disk cache for LLM answers, keyed by model, prompt template and input content.
+
+    Entries live in ``<root>/responses.sqlite``. Entries older than ``max_age_days`` are not used,
+    and once the cache grows past ``max_bytes`` the least recently used ones are dropped.
+    ``bypass=True`` always asks the model but still stores fresh answers.
+    """
+
+    def __init__(self, root="llm_cache", max_bytes: int = 200 * 1024 * 1024, max_age_days: Optional[float] = 30,
+                 bypass: bool = False):
+        os.makedirs(root, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.max_age = max_age_days * 86400 if max_age_days is not None else None
+        self.bypass = bypass
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.RLock()
+        self.conn = sqlite3.connect(os.path.join(str(root), "responses.sqlite"), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_responses_last_used ON responses (last_used);
+            """
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def template_version(template: str) -> str:
+        """Short hash of a prompt template: editing the prompt invalidates its cached answers."""
+        return hashlib.sha256(template.encode("utf-8")).hexdigest()[:12]
+
+    @staticmethod
+    def key(model: str, template: str, *inputs: bytes) -> str:
+        digest = hashlib.sha256()
+        digest.update(f"{model}\0{ResponseCache.template_version(template)}\0".encode("utf-8"))
+        for data in inputs:
+            digest.update(hashlib.sha256(data).digest())
+        return digest.hexdigest()
+
+    @staticmethod
+    def file_key(model: str, template: str, *paths) -> str:
+        inputs = []
+        for path in paths:
+            with open(path, "rb") as f:
+                inputs.append(f.read())
+        return ResponseCache.key(model, template, *inputs)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            if self.bypass:
+                self.misses += 1
+                return None
+            row = self.conn.execute("SELECT response, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+            now = time.time()
+            if row is None or (self.max_age is not None and now - row[1] > self.max_age):
+                self.misses += 1
+                return None
+            self.conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (now, key))
+            self.conn.commit()
+            self.hits += 1
+            return row[0]
+
+    def put(self, key: str, model: str, response: str) -> None:
+        if not response or not response.strip():
+            return
+        now = time.time()
+        with self._lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses (key, model, response, size, created_at, last_used) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (key, model, response, len(response.encode("utf-8")), now, now),
+            )
+            self.conn.commit()
+            self.evict()
+
+    def evict(self) -> int:
+        """Drop expired entries, then the least recently used ones until the cache fits ``max_bytes``."""
+        with self._lock:
+            before = self.conn.total_changes
+            if self.max_age is not None:
+                self.conn.execute("DELETE FROM responses WHERE created_at < ?", (time.time() - self.max_age,))
+            total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+            if total > self.max_bytes:
+                doomed = []
+                for key, size in self.conn.execute("SELECT key, size FROM responses ORDER BY last_used"):
+                    if total <= self.max_bytes:
+                        break
+                    doomed.append((key,))
+                    total -= size
+                self.conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+            self.conn.commit()
+            return self.conn.total_changes - before
+
+    def stats(self) -> dict:
+        with self._lock:
+            entries, size = self.conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        return {"hits": self.hits, "misses": self.misses, "entries": entries, "bytes": size}
+
+    def clear(self) -> None:
+        with self._lock:
+            self.conn.execute("DELETE FROM responses")
+            self.conn.commit()
+
+    def close(self) -> None:
+        self.conn.close()
@@ -0,0 +1,107 @@
+import math
+import os
+import re
+from typing import Dict, List
+
+try:
+    from PIL import Image, features
+except ImportError:  # optional, screenshots are used as captured without Pillow
+    Image = None
+
+TILE_PATTERN = re.compile(r"^(?P<page>.+)__tile(?P<index>\d+)$")
+
+
+def page_name(image_file: str) -> str:
+    """Name of the page a (possibly tiled) screenshot belongs to, without extension and tile suffix."""
+    stem = os.path.splitext(image_file)[0]
+    match = TILE_PATTERN.match(stem)
+    return match.group("page") if match else stem
+
+
+def group_tiles(image_files: List[str]) -> Dict[str, List[str]]:
+    """Map each page name to its screenshot files in tile order."""
+    pages: Dict[str, List[str]] = {}
+    for image_file in sorted(image_files):
+        pages.setdefault(page_name(image_file), []).append(image_file)
+    return pages
+
+
+def estimate_image_tokens(image_path: str) -> int:
+    """Input tokens of an image at high detail: fitted into 2048x2048, shortest side scaled to 768,
+    then 170 tokens per 512px tile plus 85. Without Pillow a full-size tile count is assumed."""
+    if Image is None:
+        return 85 + 170 * 6
+    with Image.open(image_path) as img:
+        width, height = img.size
+    scale = min(1.0, 2048 / max(width, height))
+    scale *= min(1.0, 768 / (min(width, height) * scale))
+    return 85 + 170 * math.ceil(width * scale / 512) * math.ceil(height * scale / 512)
+
+
+class ScreenshotProcessor:
+    """Turns captured PNG screenshots into compact upload images.
+
+    Images are scaled down to ``max_width``, encoded as WebP (JPEG if Pillow lacks WebP) and,
+    when taller than ``tile_height``, cut into viewport-sized tiles named ``<page>__tileNN``.
+    At most ``max_tiles`` tiles are kept per page; the top of a page holds the interactive content.
+    """
+
+    def __init__(self, max_width: int = 1280, tile_height: int = 1600, max_tiles: int = 4,
+                 image_format: str = "webp", quality: int = 80):
+        self.max_width = max_width
+        self.tile_height = tile_height
+        self.max_tiles = max_tiles
+        self.quality = quality
+        if Image is not None and image_format == "webp" and not features.check("webp"):
+            image_format = "jpeg"
+        self.image_format = image_format
+        self.extension = ".jpg" if image_format == "jpeg" else f".{image_format}"
+
+    def process(self, image_path: str, output_folder) -> List[str]:
+        stem, source_extension = os.path.splitext(os.path.basename(image_path))
+        existing = self._outputs(output_folder, stem, source_extension)
+        if existing and min(os.path.getmtime(p) for p in existing) >= os.path.getmtime(image_path):
+            return existing
+        for path in existing:
+            os.remove(path)
+        if Image is None:
+            # Without Pillow the original file is passed through unchanged
+            target = os.path.join(output_folder, os.path.basename(image_path))
+            with open(image_path, "rb") as src, open(target, "wb") as dst:
+                dst.write(src.read())
+            return [target]
+
+        with Image.open(image_path) as img:
+            img = img.convert("RGB")
+            if img.width > self.max_width:
+                img = img.resize((self.max_width, round(img.height * self.max_width / img.width)), Image.LANCZOS)
+            tiles = self._tiles(img)
+            paths = []
+            for index, tile in enumerate(tiles, start=1):
+                name = stem if len(tiles) == 1 else f"{stem}__tile{index:02d}"
+                path = os.path.join(output_folder, name + self.extension)
+                tile.save(path, self.image_format.upper(), quality=self.quality, optimize=True)
+                paths.append(path)
+        before = os.path.getsize(image_path)
+        after = sum(os.path.getsize(p) for p in paths)
+        print(f"🗜️ {os.path.basename(image_path)}: {before // 1024} KB → {after // 1024} KB in {len(paths)} image(s)")
+        return paths
+
+    def _tiles(self, img) -> list:
+        if img.height <= self.tile_height:
+            return [img]
+        tiles = []
+        for top in range(0, img.height, self.tile_height):
+            if len(tiles) == self.max_tiles:
+                break
+            tiles.append(img.crop((0, top, img.width, min(top + self.tile_height, img.height))))
+        return tiles
+
+    def _outputs(self, output_folder, stem: str, source_extension: str) -> List[str]:
+        """This page's outputs only: ``<stem><ext>`` and ``<stem>__tileNN<ext>``, never ``<stem>.2<ext>``
+        of another page. ``source_extension`` covers the unchanged copy written without Pillow."""
+        extensions = "|".join(re.escape(e) for e in {self.extension, source_extension})
+        own = re.compile(rf"{re.escape(stem)}(__tile\d+)?(?:{extensions})")
+        if not os.path.isdir(output_folder):
+            return []
+        return sorted(os.path.join(output_folder, f) for f in os.listdir(output_folder) if own.fullmatch(f))
@@ -0,0 +1,155 @@
+import xml.etree.ElementTree as ET
+import zlib
+from typing import Iterator, List, Optional, Tuple
+from urllib.parse import urljoin
+from urllib.robotparser import RobotFileParser
+
+from UrlCanonicalizer import canonical_netloc
+
+
+class SitemapSeeder:
+    """Seeds the crawl frontier from robots.txt and (nested, gzipped) XML sitemaps.
+
+    Sitemaps are parsed incrementally while downloading so large sitemap files never sit in memory as a whole.
+    """
+
+    def __init__(self, session, user_agent: str = "*", timeout=(5.0, 30.0), max_sitemaps: int = 500,
+                 respect_robots: bool = True):
+        self.session = session
+        self.user_agent = user_agent
+        self.timeout = timeout
+        self.max_sitemaps = max_sitemaps
+        self.respect_robots = respect_robots
+        self.robots: Optional[RobotFileParser] = None
+        self._fractional_delay: Optional[float] = None
+
+    def load_robots(self, start_url: str) -> RobotFileParser:
+        robots_url = urljoin(start_url, "/robots.txt")
+        parser = RobotFileParser(robots_url)
+        try:
+            response = self.session.get(robots_url, timeout=self.timeout)
+        except Exception as e:
+            print(f"⚠️ Could not load {robots_url}: {e}")
+            parser.parse([])
+        else:
+            if response.status_code in (401, 403) and self.respect_robots:
+                parser.disallow_all = True
+            elif response.status_code >= 400:
+                parser.parse([])
+            else:
+                lines = response.text.splitlines()
+                parser.parse(lines)
+                self._fractional_delay = self._parse_crawl_delay(lines)
+        self.robots = parser
+        return parser
+
+    def _parse_crawl_delay(self, lines: List[str]) -> Optional[float]:
+        """RobotFileParser ignores non-integer delays such as ``Crawl-delay: 0.5``."""
+        agents, in_rules, delays = set(), False, {}
+        for line in lines:
+            key, _, value = line.split("#", 1)[0].partition(":")
+            key, value = key.strip().lower(), value.strip()
+            if key == "user-agent":
+                if in_rules:
+                    agents, in_rules = set(), False
+                agents.add(value.lower())
+                continue
+            in_rules = True
+            if key == "crawl-delay":
+                try:
+                    for agent in agents:
+                        delays.setdefault(agent, float(value))
+                except ValueError:
+                    pass
+        return delays.get(self.user_agent.lower(), delays.get("*"))
+
+    def can_fetch(self, url: str) -> bool:
+        if not self.respect_robots or self.robots is None:
+            return True
+        return self.robots.can_fetch(self.user_agent, url)
+
+    def crawl_delay(self) -> Optional[float]:
+        if not self.respect_robots or self.robots is None:
+            return None
+        delay = self.robots.crawl_delay(self.user_agent)
+        if delay is None:
+            delay = self._fractional_delay
+        if delay is None:
+            rate = self.robots.request_rate(self.user_agent)
+            if rate is not None and rate.requests:
+                delay = rate.seconds / rate.requests
+        return float(delay) if delay is not None else None
+
+    def sitemap_urls(self, start_url: str) -> List[str]:
+        listed = self.robots.site_maps() if self.robots is not None else None
+        return list(listed) if listed else [urljoin(start_url, "/sitemap.xml")]
+
+    def iter_sitemap(self, sitemap_url: str) -> Iterator[Tuple[str, Optional[str]]]:
+        """Yield ``(loc, lastmod)`` for every page, following sitemap indexes breadth-first."""
+        pending, seen = [sitemap_url], set()
+        while pending and len(seen) < self.max_sitemaps:
+            current = pending.pop(0)
+            if current in seen:
+                continue
+            seen.add(current)
+            try:
+                for kind, loc, lastmod in self._parse(current):
+                    if kind == "sitemap":
+                        pending.append(loc)
+                    else:
+                        yield loc, lastmod
+            except Exception as e:
+                print(f"⚠️ Could not read sitemap {current}: {e}")
+
+    def _parse(self, sitemap_url: str) -> Iterator[Tuple[str, str, Optional[str]]]:
+        with self.session.get(sitemap_url, timeout=self.timeout, stream=True) as response:
+            if response.status_code >= 400:
+                return
+            parser = ET.XMLPullParser(events=("end",))
+            decompressor = None
+            loc, lastmod = None, None
+            for chunk in response.iter_content(chunk_size=64 * 1024):
+                # .xml.gz files are served as gzip bodies, not as Content-Encoding
+                if decompressor is None and chunk[:2] == b"\x1f\x8b":
+                    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+                parser.feed(decompressor.decompress(chunk) if decompressor else chunk)
+                for _, element in parser.read_events():
+                    tag = element.tag.rsplit("}", 1)[-1]
+                    if tag == "loc" and loc is None:
+                        # First <loc> of an entry; later ones belong to extensions such as image sitemaps
+                        loc = (element.text or "").strip()
+                    elif tag == "lastmod" and lastmod is None:
+                        lastmod = (element.text or "").strip() or None
+                    elif tag in ("url", "sitemap"):
+                        if loc:
+                            yield ("sitemap" if tag == "sitemap" else "url"), loc, lastmod
+                        loc, lastmod = None, None
+                        element.clear()
+
+    def seed(self, frontier, start_url: str, batch_size: int = 1000, scheduler=None) -> int:
+        """Load robots.txt and push all same-host sitemap URLs into ``frontier``. Returns the number added.
+
+        With a CrawlScheduler, URLs it does not allow are left out and the rest are queued with its priority.
+        """
+        base_domain = canonical_netloc(start_url)
+        if self.robots is None:
+            self.load_robots(start_url)
+        added, batch = 0, []
+        for sitemap_url in self.sitemap_urls(start_url):
+            for loc, lastmod in self.iter_sitemap(sitemap_url):
+                if canonical_netloc(loc) != base_domain or not self.can_fetch(loc):
+                    continue
+                batch.append((loc, lastmod))
+                if len(batch) >= batch_size:
+                    added += self._add(frontier, batch, scheduler)
+                    batch = []
+        if batch:
+            added += self._add(frontier, batch, scheduler)
+        return added
+
+    def _add(self, frontier, batch: List[Tuple[str, Optional[str]]], scheduler) -> int:
+        if scheduler is None:
+            return frontier.add_seeds(batch)
+        priorities = scheduler.rank([loc for loc, _ in batch], 1)
+        return frontier.add_seeds([(loc, lastmod) for loc, lastmod in batch if loc in priorities],
+                                  priorities=priorities)
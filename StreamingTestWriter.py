@@ -0,0 +1,189 @@
+import ast
+import os
+import re
+from pathlib import Path
+
+from TestUtils import extract_test_code
+
+PYTHON_START = re.compile(r"^\s*(#|import\s|from\s|def\s|async\s+def\s|class\s|@)")
+CONTINUATION = re.compile(r"^(\s|\)|\]|\}|else\b|elif\b|except\b|finally\b|#)")
+CLASS_START = re.compile(r"^(async\s+)?class\s")
+
+
+class NotPythonOutput(ValueError):
+    """Raised while streaming when the answer is clearly not Python code."""
+
+
+class StreamingTestWriter:
+    """Writes a test file while the model's answer is still streaming in.
+
+    ``feed`` receives text deltas. Code inside ```python blocks (or an answer that starts as plain
+    Python) is split into top-level statements; every statement that parses is appended to the
+    file right away, so the first tests are on disk long before the answer is complete. Inside a
+    ``class Test...`` the methods are appended one by one in the same way.
+    ``feed`` raises NotPythonOutput, which ends the stream, if ``prose_limit`` characters arrive
+    without any code, if a block that failed to parse grows beyond ``max_unparsed_lines`` lines, or
+    if the answer grows beyond ``max_chars``. ``close`` rewrites the file with the complete answer's code.
+    """
+
+    def __init__(self, path, prose_limit: int = 1500, max_unparsed_lines: int = 150, max_chars: int = 200_000):
+        self.path = Path(path)
+        self.prose_limit = prose_limit
+        self.max_unparsed_lines = max_unparsed_lines
+        self.max_chars = max_chars
+        self.text = ""
+        self.tests_written = 0
+        self._line = ""
+        self._mode = None  # None: no code yet, "fence": inside a ```python block, "plain": unfenced code
+        self._in_code = False
+        self._pending = []
+        # The last flush attempt of the pending block was a SyntaxError
+        self._invalid = False
+        # A class whose header is on disk already; _pending then holds its next members
+        self._class_open = False
+        self._member_indent = None
+        self._written = 0
+        self._file = None
+
+    def feed(self, delta: str) -> None:
+        self.text += delta
+        if len(self.text) > self.max_chars:
+            raise NotPythonOutput(f"Answer longer than {self.max_chars} characters, aborted.")
+        self._line += delta
+        *lines, self._line = self._line.split("\n")
+        for line in lines:
+            self._handle_line(line)
+        if self._mode is None and len(self.text) > self.prose_limit:
+            raise NotPythonOutput(f"No Python code in the first {self.prose_limit} characters, aborted.")
+
+    def _handle_line(self, line: str) -> None:
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            if self._in_code:
+                self._flush(final=True)
+                self._in_code = False
+            elif stripped[3:].strip().lower() in ("python", "py"):
+                self._mode, self._in_code = "fence", True
+            return
+        if self._mode is None and stripped and PYTHON_START.match(line):
+            self._mode, self._in_code = "plain", True
+        if not self._in_code:
+            return
+        if self._after_decorator():
+            # The decorated definition follows, nothing is complete yet
+            pass
+        elif line and not CONTINUATION.match(line):
+            # A new top-level statement starts: everything before it is complete if it parses
+            self._flush()
+        elif self._member_starts(line):
+            # A new method (or attribute) of a class starts: the members before it are complete
+            self._flush_members()
+        self._pending.append(line)
+        if self._invalid and len(self._pending) > self.max_unparsed_lines:
+            raise NotPythonOutput(f"{len(self._pending)} lines without valid Python, aborted.")
+
+    def _after_decorator(self) -> bool:
+        """The pending block ends with a decorator, so the next line belongs to it."""
+        last = next((l for l in reversed(self._pending) if l.strip()), "")
+        return last.lstrip().startswith("@")
+
+    def _member_starts(self, line: str) -> bool:
+        stripped = line.lstrip()
+        if not stripped or CONTINUATION.match(stripped):
+            return False
+        indent = line[:len(line) - len(stripped)]
+        if not self._class_open:
+            header = next((l for l in self._pending if l.strip() and not l.lstrip().startswith(("@", "#"))), "")
+            if not CLASS_START.match(header):
+                return False
+            if self._member_indent is None:
+                # First member: it defines the indentation, there is nothing to write before it yet
+                self._member_indent = indent
+                return False
+        return indent == self._member_indent
+
+    def _flush_members(self, final: bool = False) -> None:
+        """Write the pending part of a class: its header and first members, or further members."""
+        if self._class_open:
+            source = "\n".join(self._pending).strip("\n")
+            check = "class _Pending:\n" + source
+        else:
+            source = check = "\n".join(self._pending).strip("\n")
+        if source.strip():
+            try:
+                tree = ast.parse(check)
+            except SyntaxError:
+                self._invalid = not final
+                if final:
+                    self._pending = []
+                return
+            self._write(source)
+            self.tests_written += self._count_tests(tree)
+            self._class_open = True
+        self._pending = []
+        self._invalid = False
+
+    def _flush(self, final: bool = False) -> None:
+        if self._class_open:
+            # The class ends here; its last members are written like the others
+            self._flush_members(final)
+            if not self._pending:
+                self._class_open = False
+                self._member_indent = None
+            return
+        source = "\n".join(self._pending).strip("\n")
+        if not source.strip():
+            self._pending = []
+            return
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            if final:
+                # Left to close(), which writes the block as a whole, like the non-streaming path
+                self._pending = []
+            else:
+                self._invalid = True
+            return
+        self._write(source)
+        self.tests_written += self._count_tests(tree)
+        self._pending = []
+        self._invalid = False
+        self._member_indent = None
+
+    @staticmethod
+    def _count_tests(tree: ast.Module) -> int:
+        """test* functions, including the methods of the classes in ``tree``."""
+        count = 0
+        for node in tree.body:
+            members = node.body if isinstance(node, ast.ClassDef) else [node]
+            count += sum(isinstance(m, (ast.FunctionDef, ast.AsyncFunctionDef)) and m.name.startswith("test")
+                         for m in members)
+        return count
+
+    def _write(self, source: str) -> None:
+        if self._file is None:
+            self._file = open(self.path, "w", encoding="utf-8")
+        self._file.write(("\n\n" if self._written else "") + source)
+        self._file.flush()
+        self._written += 1
+
+    def close(self) -> str:
+        """Finish the file with the code of the complete answer and return it ("" if there is none)."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        code = extract_test_code(self.text) if self.text.strip() else ""
+        if code:
+            tmp_path = self.path.with_suffix(self.path.suffix + ".tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(code)
+            os.replace(tmp_path, self.path)
+        return code
+
+    def abort(self) -> None:
+        """Remove the partly written file after a failed or aborted stream."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+        if self._written and self.path.exists():
+            self.path.unlink()
@@ -6,6 +6,16 @@ from pathlib import Path
 import re
 import subprocess
 
+from PerceptualHash import DEFAULT_THRESHOLD, cluster_images
+from PromptTemplates import test_generation_prefix
+from ScreenshotProcessor import estimate_image_tokens, group_tiles
+
+
+def extract_test_code(response: str) -> str:
+    """Python code from the model's code blocks, or the whole answer if it has none."""
+    code_blocks = re.findall(r"```python(.*?)```", response, re.DOTALL)
+    return "\n\n".join(cb.strip() for cb in code_blocks) if code_blocks else response.strip()
+
 
 class TestUtils:
     @staticmethod
@@ -56,9 +66,17 @@ class TestUtils:
         
     @staticmethod
     def contains_test_functions(filepath):
+        """True if pytest would find a test: a top-level test function or a test method of a Test* class."""
         with open(filepath, "r", encoding="utf-8") as f:
             tree = ast.parse(f.read(), filename=filepath)
-        return any(isinstance(node, ast.FunctionDef) and node.name.startswith("test_") for node in tree.body)
+        test_function = (ast.FunctionDef, ast.AsyncFunctionDef)
+        for node in tree.body:
+            if isinstance(node, test_function) and node.name.startswith("test"):
+                return True
+            if isinstance(node, ast.ClassDef) and node.name.startswith("Test") and any(
+                    isinstance(member, test_function) and member.name.startswith("test") for member in node.body):
+                return True
+        return False
 
     @staticmethod
     def is_collected_by_pytest(filepath):
@@ -78,59 +96,113 @@ class TestUtils:
         )
 
 class RequirementCombiner:
-    
-    def combine(requirements_dir, scraped_dir, output_dir):
+    SECTIONS = re.compile(
+        r"\A##### (?P<page_title>.*?) #####\n\n(?P<page>.*)\n\n\n##### (?P<requirements_title>.*?) #####\n\n"
+        r"(?P<requirements>.*)\n### TEST URL ###\n\n(?P<url>.*?)\n\Z", re.DOTALL)
+
+    @staticmethod
+    def build(scraped_content, req_content, test_url, page_title="SCRAPED PAGE",
+              requirements_title="TEST REQUIREMENTS") -> str:
+        """The page-specific part of a prompt. Instructions and the example test are not repeated
+        here, the connectors put them in front as the shared PromptTemplates prefix."""
+        return (
+            f"##### {page_title} #####\n\n"
+            f"{scraped_content}\n\n"
+            f"\n##### {requirements_title} #####\n\n"
+            f"{req_content}"
+            f"\n### TEST URL ###\n\n"
+            f"{test_url}\n"
+        )
+
+    @staticmethod
+    def split(combined: str):
+        """Sections of a combined file as a dict (keys as in ``build``), None if it is not one."""
+        match = RequirementCombiner.SECTIONS.match(combined)
+        return match.groupdict() if match else None
+
+    def combine(requirements_dir, scraped_dir, output_dir, unchanged=None, page_store=None, reducer=None):
         os.makedirs(output_dir, exist_ok=True)
 
         requirement_files = [f for f in os.listdir(requirements_dir) if f.endswith(".txt")]
-        scraped_files = [f for f in os.listdir(scraped_dir) if f.endswith((".txt", ".html"))]
+        for req_file in requirement_files:
+            RequirementCombiner.combine_file(req_file, requirements_dir, scraped_dir, output_dir, unchanged, page_store,
+                                             reducer)
+        if reducer is not None:
+            print(f"✂️ HTML reduction: {reducer.stats()}")
 
-        # Precompute normalized scraped filenames
-        scraped_map = {
-            TestUtils.normalize_name(f): f for f in scraped_files
-        }
+    @staticmethod
+    def combine_file(req_file, requirements_dir, scraped_dir, output_dir, unchanged=None, page_store=None,
+                     reducer=None, url=None):
+        """Combine one requirements file with its scraped page. Returns the output path or None.
 
-        for req_file in requirement_files:
-            req_norm = TestUtils.normalize_name(req_file)
-            test_url = TestUtils.restore_url_string(req_file)
+        With a known page ``url`` the page comes straight from the page store; the lossy page key
+        (and then the file name heuristics) are only used for folder-based runs without it.
+        With an HtmlReducer the page is replaced by its outline, sized so the whole prompt stays
+        within the reducer's token budget."""
+        req_norm = TestUtils.normalize_name(req_file)
+        output_path = os.path.join(output_dir, req_norm + "_combined.txt")
+        if unchanged is not None and req_norm in unchanged and os.path.exists(output_path):
+            print(f"⏩ Skipping {req_file} – page unchanged since the last run.")
+            return output_path
+
+        entry = None
+        if page_store is not None:
+            entry = page_store.lookup(url) if url is not None else page_store.find_by_key(req_norm)
+        if entry is not None:
+            test_url = entry["url"]
+            matched_scraped_file = test_url
+            scraped_path = None
+        else:
+            scraped_files = [f for f in os.listdir(scraped_dir) if f.endswith((".txt", ".html"))] if os.path.isdir(scraped_dir) else []
+            # Precompute normalized scraped filenames
+            scraped_map = {
+                TestUtils.normalize_name(f): f for f in scraped_files
+            }
+            test_url = url or TestUtils.restore_url_string(req_file)
             best_match = difflib.get_close_matches(req_norm, scraped_map.keys(), n=1, cutoff=0.6)
             if not best_match:
                 print(f"⚠️ No matching scraped file found for {req_file}.")
-                continue
-
+                return None
             matched_scraped_file = scraped_map[best_match[0]]
-
-            req_path = os.path.join(requirements_dir, req_file)
             scraped_path = os.path.join(scraped_dir, matched_scraped_file)
-            output_path = os.path.join(output_dir, TestUtils.normalize_name(req_file) + "_combined.txt")
-            try:
-                with open(scraped_path, "r", encoding="utf-8") as f1, open(req_path, "r", encoding="utf-8") as f2, open("exampleTest.txt", "r", encoding="utf-8") as file:
+
+        req_path = os.path.join(requirements_dir, req_file)
+        try:
+            if scraped_path is None:
+                scraped_content = page_store.get(test_url).strip()
+            else:
+                with open(scraped_path, "r", encoding="utf-8") as f1:
                     scraped_content = f1.read().strip()
-                    req_content = f2.read().strip()
-                    content = file.read()
-
-                combined = (
-                    f"##### SCRAPED PAGE #####\n\n"
-                    f"{scraped_content}\n\n"
-                    f"\n##### TEST REQUIREMENTS #####\n\n"
-                    f"{req_content}"
-                    f"\n### TEST URL ###\n\n"
-                    f"{test_url}"
-                    f"\n### Use the following test as a template\n\n"
-                    f"{content}\n"
-                    
-                )
+            with open(req_path, "r", encoding="utf-8") as f2:
+                req_content = f2.read().strip()
 
-                with open(output_path, "w", encoding="utf-8") as out_file:
-                    out_file.write(combined)
+            page_title = "SCRAPED PAGE"
+            if reducer is not None:
+                page_title = "SCRAPED PAGE (outline of the interactive elements)"
+                reserved = reducer.count(test_generation_prefix()
+                                         + RequirementCombiner.build("", req_content, test_url, page_title))
+                scraped_content = reducer.reduce(scraped_content, reserved)
+            combined = RequirementCombiner.build(scraped_content, req_content, test_url, page_title)
 
-                print(f"✅ Combined and saved: {output_path}")
-            except Exception as e:
-                print(f"❌ Error combining {req_file} with {matched_scraped_file}: {e}")
+            with open(output_path, "w", encoding="utf-8") as out_file:
+                out_file.write(combined)
+
+            print(f"✅ Combined and saved: {output_path}")
+            return output_path
+        except Exception as e:
+            print(f"❌ Error combining {req_file} with {matched_scraped_file}: {e}")
+            return None
 
 class ImageRequirementProcessor:
     @staticmethod
-    def process(connector, image_folder: str):
+    def process(connector, image_folder: str, unchanged=None, dedup_threshold=DEFAULT_THRESHOLD, batch: bool = True,
+                max_images: int = 8, max_image_tokens: int = 8000):
+        """dedup_threshold: max dHash distance for screenshots to share one result (None disables).
+
+        With ``batch`` several pages are analysed in one run, up to ``max_images`` images and
+        ``max_image_tokens`` estimated image tokens; pages of a batch whose answer cannot be
+        split are retried one by one.
+        """
         if not os.path.isdir(image_folder):
             raise ValueError(f"Folder not found: {image_folder}")
 
@@ -148,16 +220,85 @@ class ImageRequirementProcessor:
             print("⚠️ No image files found in folder.")
             return
 
-        for image_file in image_files:
-            image_path = os.path.join(image_folder, image_file)
-            output_path = os.path.join(output_dir, os.path.splitext(image_file)[0] + ".txt")
+        # Tiles of one tall page (<page>__tileNN) are analysed together; clustering uses the first tile
+        pages = group_tiles(image_files)
+        first_tiles = {tiles[0]: page for page, tiles in pages.items()}
+        clusters = cluster_images(image_folder, list(first_tiles), dedup_threshold)
+        representatives = {}
+        for first_tile in clusters:
+            image_file = first_tiles[first_tile]
+            representatives[image_file] = [os.path.join(image_folder, t) for t in pages[image_file]]
+        done = {}
+        if batch and hasattr(connector, "generate_requirements_from_images"):
+            todo = {}
+            for image_file, tiles in representatives.items():
+                if ImageRequirementProcessor._needs_processing(image_file, output_dir, unchanged):
+                    todo[image_file] = tiles
+                else:
+                    done[image_file] = os.path.join(output_dir, image_file + ".txt")
+            for group in ImageRequirementProcessor._batches(todo, max_images, max_image_tokens):
+                if len(group) > 1:
+                    done.update(ImageRequirementProcessor.process_batch(connector, group, output_dir))
+        for first_tile, members in clusters.items():
+            image_file = first_tiles[first_tile]
+            output_path = done.get(image_file) or ImageRequirementProcessor.process_page(
+                connector, image_file, representatives[image_file], output_dir, unchanged)
+            if output_path is not None and len(members) > 1:
+                ImageRequirementProcessor._share_result(output_path, output_dir, [first_tiles[m] for m in members[1:]])
 
-            if os.path.exists(output_path):
-                print(f"⏩ Skipping {image_file} – Output file already exists.")
-                continue
+    @staticmethod
+    def _batches(pages, max_images, max_image_tokens):
+        """Group pages so each group stays within the image count and image token budget."""
+        group, images, tokens = {}, 0, 0
+        for image_file, tiles in pages.items():
+            cost = sum(estimate_image_tokens(t) for t in tiles)
+            if group and (images + len(tiles) > max_images or tokens + cost > max_image_tokens):
+                yield group
+                group, images, tokens = {}, 0, 0
+            group[image_file] = tiles
+            images += len(tiles)
+            tokens += cost
+        if group:
+            yield group
 
-            print(f"🔍 Processing image: {image_file}")
+    @staticmethod
+    def process_batch(connector, pages, output_dir):
+        """Requirements for several pages in one call. Returns {image_file: output path} of the pages
+        that were written; empty if the answer could not be split (callers fall back to process_page)."""
+        print(f"🔍 Processing {len(pages)} images in one batch: {', '.join(pages)}")
+        try:
+            answers = connector.generate_requirements_from_images(pages)
+        except Exception as e:
+            print(f"⚠️ Batch failed ({e}), processing the images one by one.")
+            return {}
+        written = {}
+        for image_file, requirements in answers.items():
+            output_path = os.path.join(output_dir, image_file + ".txt")
+            with open(output_path, "w", encoding="utf-8") as out_file:
+                out_file.write(requirements)
+            print(f"✅ Saved: {output_path}")
+            written[image_file] = output_path
+        return written
 
+    @staticmethod
+    def _needs_processing(image_file, output_dir, unchanged=None) -> bool:
+        output_path = os.path.join(output_dir, image_file + ".txt")
+        if unchanged is None and os.path.exists(output_path):
+            print(f"⏩ Skipping {image_file} – Output file already exists.")
+            return False
+        if unchanged is not None and TestUtils.normalize_name(os.path.basename(output_path)) in unchanged and os.path.exists(output_path):
+            print(f"⏩ Skipping {image_file} – page unchanged since the last run.")
+            return False
+        return True
+
+    @staticmethod
+    def process_page(connector, image_file, tiles, output_dir, unchanged=None):
+        """Requirements for one page's screenshot tiles. Returns the output path or None on failure."""
+        image_path = tiles[0] if len(tiles) == 1 else tiles
+        output_path = os.path.join(output_dir, image_file + ".txt")
+
+        if ImageRequirementProcessor._needs_processing(image_file, output_dir, unchanged):
+            print(f"🔍 Processing image: {image_file}")
             try:
                 requirements = connector.generate_requirements_from_image(image_path)
                 with open(output_path, "w", encoding="utf-8") as out_file:
@@ -165,6 +306,19 @@ class ImageRequirementProcessor:
                 print(f"✅ Saved: {output_path}")
             except Exception as e:
                 print(f"❌ Error with {image_file}: {e}")
+                return None
+        return output_path
+
+    @staticmethod
+    def _share_result(output_path, output_dir, duplicates):
+        """Copy the representative's requirements to visually identical screenshots."""
+        with open(output_path, "r", encoding="utf-8") as f:
+            requirements = f.read()
+        for duplicate in duplicates:
+            duplicate_path = os.path.join(output_dir, duplicate + ".txt")
+            with open(duplicate_path, "w", encoding="utf-8") as out_file:
+                out_file.write(requirements)
+            print(f"♻️ Reused requirements of {os.path.basename(output_path)} for {duplicate}")
 
 class DirectorySetup:
     @staticmethod
@@ -0,0 +1,70 @@
+import posixpath
+from typing import Iterable, Optional
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+
+# Session ids and tracking parameters that never change the page content.
+DEFAULT_IGNORED_PARAMS = {
+    "jsessionid", "phpsessid", "sid", "sessionid", "session_id", "aspsessionid",
+    "utm_source", "utm_medium", "utm_campaign", "utm_term", "utm_content",
+    "gclid", "fbclid", "msclkid", "_ga",
+}
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def canonical_netloc(url: str) -> str:
+    """Host part of ``url`` as in canonical URLs: lowercase host, IPv6 in brackets, no default port,
+    user info unchanged. Use it for every same-host comparison."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").lower()
+    if ":" in host:
+        host = f"[{host}]"
+    port = parts.port
+    netloc = host if port is None or DEFAULT_PORTS.get(scheme) == port else f"{host}:{port}"
+    userinfo, at, _ = parts.netloc.rpartition("@")
+    return f"{userinfo}@{netloc}" if at else netloc
+
+
+class UrlCanonicalizer:
+    """Maps equivalent URLs to one canonical form used as the crawl key.
+
+    A trailing slash is kept by default: ``/docs/`` and ``/docs`` resolve relative links differently.
+    """
+
+    def __init__(self, ignored_params: Optional[Iterable[str]] = None, strip_trailing_slash: bool = False,
+                 sort_query: bool = True):
+        params = DEFAULT_IGNORED_PARAMS if ignored_params is None else ignored_params
+        self.ignored_params = {p.lower() for p in params}
+        self.strip_trailing_slash = strip_trailing_slash
+        self.sort_query = sort_query
+
+    def canonicalize(self, url: str) -> str:
+        parts = urlsplit(url.strip())
+        return urlunsplit((parts.scheme.lower(), canonical_netloc(url), self._path(parts.path),
+                           self._query(parts.query), ""))
+
+    def _path(self, path: str) -> str:
+        # Drop ;jsessionid=... style path parameters
+        segments = []
+        for segment in path.split("/"):
+            name = segment.split(";", 1)
+            if len(name) == 2 and name[1].split("=", 1)[0].lower() in self.ignored_params:
+                segment = name[0]
+            segments.append(segment)
+        path = "/".join(segments) or "/"
+        trailing = path.endswith("/")
+        path = posixpath.normpath(path)
+        if path.startswith("//"):
+            path = "/" + path.lstrip("/")
+        if trailing and path != "/" and not self.strip_trailing_slash:
+            path += "/"
+        return path
+
+    def _query(self, query: str) -> str:
+        # Parameters are kept byte for byte (``?flag`` stays without "=", %20 is not re-encoded)
+        pairs = [pair for pair in query.split("&")
+                 if pair and unquote_plus(pair.split("=", 1)[0]).lower() not in self.ignored_params]
+        if self.sort_query:
+            pairs.sort()
+        return "&".join(pairs)
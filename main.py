@@ -1,17 +1,15 @@
 import os
-import re
 from OpenAIAPIConnector import OpenAIAPIConnector
 from DeepSeekAPIConnector import DeepSeekAPIConnector
 from webscraper import RecursiveWebScraper
-from pathlib import Path
+from PageStore import PageStore
+from Pipeline import TestGenerationPipeline
+from BatchGenerator import BatchGenerator
+from ModelCascade import ModelCascade
 import datetime
 
 # main.py
-from TestUtils import (
-    DirectorySetup,
-    ImageRequirementProcessor,
-    RequirementCombiner,
-)
+from TestUtils import DirectorySetup
 
 def main():
     
@@ -26,6 +24,9 @@ def main():
     # Ask the user for the URL to be scraped
     start_url = input("Please enter the URL to be scraped: ").strip()
 
+    # The Batch API is cheaper for large sites, but results may take up to 24 hours
+    use_batch = use_openai and input("Generate tests via the Batch API? [y/N]: ").strip().lower() == "y"
+
     if use_openai:
         bot = OpenAIAPIConnector(model="o3-mini")
     else:
@@ -37,6 +38,12 @@ def main():
         print("🔁 OpenAI bot state reset.\n")
         bot = OpenAIAPIConnector(model="o3-mini")  # Re-instantiate after reset
 
+    # Fast chat model first; the reasoning model only gets pages whose test fails the checks
+    if use_openai:
+        cheap_bot = OpenAIAPIConnector(model="gpt-4o-mini", use_assistant=False)
+    else:
+        cheap_bot = DeepSeekAPIConnector(model="deepseek-chat")
+
     # Always reset image bot (always OpenAI)
     image_bot = OpenAIAPIConnector(model="gpt-4o-mini")
     image_bot.reset_state()
@@ -53,48 +60,31 @@ def main():
     with open(_file_url, "r", encoding="utf-8") as f:
         start_url = f.read().strip()
 
-    # Scrape website and save HTML files
-    scraper = RecursiveWebScraper()
-    scraper.start_scraping(start_url=start_url, locationPath=base_path)
-
-    # Get requirements from image
-    ImageRequirementProcessor.process(image_bot, base_path / "images")
-    # Combine requirements with scraped pages
-    RequirementCombiner.combine(
-        requirements_dir=base_path / "image_requirements",
-        scraped_dir=base_path / "scraped_pages",
-        output_dir=base_path / "combined_requirements"
-    )
-    # Load requirements files from folder
-    requirement_files = [f for f in os.listdir(base_path / "combined_requirements") if f.endswith(".txt")]
-
-    for i, file_data in enumerate(requirement_files):
-
-        print(f" Asking bot with {file_data}...")
-
-        try:
-            response = bot.ask_with_file(base_path / "combined_requirements" / file_data)
-        except Exception as e:
-            print(f"❌ Error with file {file_data}: {e}")
-            continue
-
-        if not response.strip():
-            print(f"⚠️ No response received for file {file_data}.")
-            continue
-
-        print(f"✅ Response received for file {file_data}.")
-
-
-        # Extract Python code from code blocks
-        code_blocks = re.findall(r"```python(.*?)```", response, re.DOTALL)
-        test_code = "\n\n".join(cb.strip() for cb in code_blocks) if code_blocks else response.strip()
-
-        # Save generated test code in .py file
-        test_output_file = base_path / "tests" / Path(f"test_{file_data}").with_suffix(".py")
-        with open(test_output_file, "w", encoding="utf-8") as f:
-            f.write(test_code)
-
-        print(f"💾 Test saved in: {test_output_file}\n")
+    # Every page moves on to image requirements, combining, test generation and validation
+    # as soon as the crawler has stored it and taken its screenshot
+    page_store = PageStore(base_path / "page_store")
+    cascade = ModelCascade([cheap_bot, bot], log_path=base_path / "routing_log.jsonl")
+    pipeline = TestGenerationPipeline(base_path, bot, image_bot, page_store, generate=not use_batch,
+                                      cascade=cascade).start()
+    # The pipeline reads pages by URL from the compressed page store, no plain HTML copies needed
+    scraper = RecursiveWebScraper(keep_html_files=False)
+    try:
+        scraper.start_scraping(start_url=start_url, locationPath=base_path, mode="async", incremental=True,
+                               page_store=page_store, on_page=pipeline.submit_page)
+    finally:
+        stats = pipeline.close()
+    print(f"📊 Pipeline: {stats}")
+    print(f"✂️ HTML reduction: {pipeline.reducer.stats()}")
+    if use_batch:
+        BatchGenerator(bot, base_path / "batch").run(pipeline.pending, base_path / "tests")
+    else:
+        print(f"🔀 Model routing: {cascade.stats()}")
+    for name, connector in (("Cheap test bot", cheap_bot), ("Test bot", bot), ("Image bot", image_bot)):
+        if connector.cache is not None:
+            print(f"♻️ {name} response cache: {connector.cache.stats()}")
+        if isinstance(connector, OpenAIAPIConnector):
+            # Uploaded files and threads are only needed during the run
+            connector.cleanup()
 
     print("🎯 Processing completed.\n")
 
@@ -1,18 +1,54 @@
 import os
-import time
 import re
-from urllib.parse import urlparse, urljoin
+from urllib.parse import urlparse
 from typing import Set, List
 import requests
+from requests.adapters import HTTPAdapter
 from bs4 import BeautifulSoup
 
-from GeneratePagePictures import take_screenshots
+from GeneratePagePictures import ScreenshotBrowser, take_screenshots
+from AsyncCrawler import AsyncCrawler
+from CrawlFrontier import CrawlFrontier
+from CrawlScheduler import CrawlScheduler
+from IncrementalCrawlIndex import IncrementalCrawlIndex
+from RateLimiter import AdaptiveRateLimiter
+from PageParser import ParsedPage, extract_links, resolve_parser
+from UrlCanonicalizer import UrlCanonicalizer, canonical_netloc
+from DuplicateDetector import DuplicateDetector
+from PageStore import PageStore
+from SitemapSeeder import SitemapSeeder
 
 
 class RecursiveWebScraper:
-    def __init__(self, output_dir: str = "scraped_pages", sleep_time: float = 0.5):
+    def __init__(self, output_dir: str = "scraped_pages", sleep_time: float = 0.5,
+                 connect_timeout: float = 5.0, read_timeout: float = 30.0, pool_size: int = 10,
+                 rate_limiter: AdaptiveRateLimiter = None, parser: str = None,
+                 canonicalizer: UrlCanonicalizer = None, duplicate_distance: int = 3,
+                 keep_html_files: bool = True):
         self.output_dir = output_dir
+        # Plain scraped_pages/*.html copies next to the compressed page store
+        self.keep_html_files = keep_html_files
+        self.page_store = None
+        self.screenshot_browser = None
+        # Crawl budget and link order; replaced per run by start_scraping(scheduler=...)
+        self.scheduler = CrawlScheduler()
+        self.canonicalizer = canonicalizer or UrlCanonicalizer()
+        # Max SimHash bit difference for two pages to count as near-duplicates
+        self.duplicate_distance = duplicate_distance
+        self.duplicate_detector = DuplicateDetector(duplicate_distance)
+        self.parser = resolve_parser(parser)
+        # sleep_time only seeds the per-host rate; the limiter adapts it to the server's responses
         self.sleep_time = sleep_time
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.pool_size = pool_size
+        self.rate_limiter = rate_limiter or AdaptiveRateLimiter(
+            initial_rate=1.0 / sleep_time if sleep_time > 0 else AdaptiveRateLimiter().max_rate
+        )
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
 
     def safe_filename(self, url: str) -> str:
         return url.replace("://", "_").replace("/", "_").replace(":", "_")
@@ -35,15 +71,20 @@ class RecursiveWebScraper:
         return name
 
     def fetch_html(self, url: str) -> str:
+        return self.fetch(url).text
+
+    def fetch(self, url: str) -> requests.Response:
         max_retries = 5
+        host = urlparse(url).netloc
         for attempt in range(max_retries):
-            response = requests.get(url)
-            if response.status_code == 429:
-                print(f"429 Too Many Requests for {url}, sleeping before retry ({attempt+1}/{max_retries})...")
-                time.sleep(5 * (attempt + 1))
+            self.rate_limiter.acquire(host)
+            response = self.session.get(url, timeout=(self.connect_timeout, self.read_timeout))
+            delay = self.rate_limiter.on_response(host, response.status_code, response.headers.get("Retry-After"))
+            if delay:
+                print(f"{response.status_code} for {url}, backing off {delay:.1f}s before retry ({attempt+1}/{max_retries})...")
                 continue
             response.raise_for_status()
-            return response.text
+            return response
         raise Exception(f"Failed to fetch {url} after {max_retries} attempts due to rate limiting.")
 
     def save_html(self, html: str, filename: str) -> None:
@@ -51,54 +92,60 @@ class RecursiveWebScraper:
         with open(filename, "w", encoding="utf-8") as f:
             f.write(html)
 
+    def store_page(self, url: str, html: str, filename: str, title: str = "") -> None:
+        if self.page_store is not None:
+            self.page_store.put(url, html, title)
+        if self.keep_html_files or self.page_store is None:
+            self.save_html(html, filename)
+
+    def has_stored_page(self, url: str, filename: str) -> bool:
+        if self.page_store is not None:
+            return self.page_store.has(url)
+        return os.path.exists(filename)
+
+    def load_stored_page(self, url: str, filename: str) -> str:
+        if self.page_store is not None:
+            return self.page_store.get(url)
+        with open(filename, "r", encoding="utf-8") as f:
+            return f.read()
+
+    def parse_page(self, html: str, url: str, base_url: str = None) -> ParsedPage:
+        return ParsedPage(html, url, self.parser, base_url)
+
     def extract_page_info(self, html: str, url: str) -> dict:
-        soup = BeautifulSoup(html, 'html.parser')
-        title = soup.title.string.strip() if soup.title and soup.title.string else ""
-        meta_desc = ""
-        meta = soup.find("meta", attrs={"name": "description"})
-        if meta and meta.get("content"):
-            meta_desc = meta["content"].strip()
-        headings = {tag: [h.get_text(strip=True) for h in soup.find_all(tag)] for tag in ["h1", "h2", "h3"]}
-        links = [a['href'] for a in soup.find_all('a', href=True)]
-        images = [{"src": img.get("src"), "alt": img.get("alt", "")} for img in soup.find_all("img")]
-        text = soup.get_text(separator=" ", strip=True)
-        if not title or not text:
-            raise ValueError(f"Critical information missing for {url}: title or text not found.")
-        return {
-            "url": url,
-            "title": title,
-            "meta_description": meta_desc,
-            "headings": headings,
-            "links": links,
-            "images": images,
-            "text": text
-        }
+        return self.parse_page(html, url).page_info()
 
     def get_all_links(self, soup: BeautifulSoup, current_url: str, base_domain: str) -> Set[str]:
-        links = set()
-        for a_tag in soup.find_all('a', href=True):
-            href = a_tag['href']
-            full_url = urljoin(current_url, href)
-            parsed_url = urlparse(full_url)
-            if parsed_url.netloc == base_domain and full_url.startswith(('http://', 'https://')):
-                links.add(full_url)
-        return links
-
-    def scrape_site_recursive(self, url: str, base_domain: str, visited: Set[str], locationPath: str) -> None:
+        return extract_links(soup, current_url, base_domain)
+
+    def scrape_site_recursive(self, url: str, base_domain: str, visited: Set[str], locationPath: str,
+                              depth: int = 0) -> None:
+        url = self.canonicalizer.canonicalize(url)
         filename = os.path.join(locationPath / "scraped_pages", f"{self.safe_filename(url)}.html")
-        if url in visited or os.path.exists(filename):
+        if url in visited or self.has_stored_page(url, filename):
+            return
+        if not self.scheduler.reserve(url):
             return
         try:
-            html = self.fetch_html(url)
-            self.save_html(html, filename)
-            self.extract_page_info(html, url)
-            soup = BeautifulSoup(html, 'html.parser')
-            take_screenshots([url], locationPath / "images")
-            links = self.get_all_links(soup, url, base_domain)
+            response = self.fetch(url)
+            html = response.text
+            # Links are relative to where the server actually answered, e.g. after a redirect to /docs/
+            page = self.parse_page(html, url, response.url)
+            original, _ = self.duplicate_detector.check(url, page.text)
+            if original is not None:
+                visited.add(url)
+                print(f"⏩ Near-duplicate of {original}: {url}")
+                return
+            self.store_page(url, html, filename, page.title)
+            page.page_info()
+            if self.screenshot_browser is not None:
+                self.screenshot_browser.take([url], locationPath / "images")
+            else:
+                take_screenshots([url], locationPath / "images")
+            links = self.scheduler.rank(page.links(base_domain), depth + 1, page)
             visited.add(url)
-            time.sleep(self.sleep_time)
-            for link in links:
-                self.scrape_site_recursive(link, base_domain, visited, locationPath=locationPath)
+            for link in sorted(links, key=links.get):
+                self.scrape_site_recursive(link, base_domain, visited, locationPath=locationPath, depth=depth + 1)
         except Exception as e:
             print(f"Failed to fetch {url}: {e}")
 
@@ -133,9 +180,65 @@ class RecursiveWebScraper:
             print("\nErsetzter Inhalt:\n")
             print(content)
 
-    def start_scraping(self, start_url: str, locationPath: str = ""):
-        base_domain = urlparse(start_url).netloc
-        visited = set()
-        self.scrape_site_recursive(start_url, base_domain, visited,locationPath= locationPath)
-        scraped_files = self.list_scraped_files()
-        print(f"Scraped {len(scraped_files)} pages. Files are in '{self.output_dir}/'.")
+    def start_scraping(self, start_url: str, locationPath: str = "", mode: str = "recursive",
+                       max_concurrency: int = 10, per_host_concurrency: int = 4, resume: bool = False,
+                       incremental: bool = False, use_sitemaps: bool = True, respect_robots: bool = True,
+                       page_store: PageStore = None, scheduler: CrawlScheduler = None, **crawler_options):
+        self.page_store = page_store if page_store is not None else PageStore(os.path.join(locationPath, "page_store"))
+        self.scheduler = scheduler if scheduler is not None else CrawlScheduler()
+        # Crawled URLs and their hosts are canonical; the start URL and every host comparison must be too
+        start_url = self.canonicalizer.canonicalize(start_url)
+        if mode in ("async", "rendered"):
+            if mode == "rendered":
+                crawler_options["render"] = True
+            frontier = CrawlFrontier(os.path.join(locationPath, "crawl_frontier.sqlite"), self.canonicalizer)
+            if resume:
+                requeued = frontier.requeue_in_progress()
+                print(f"🔁 Resuming crawl: {frontier.stats()} ({requeued} interrupted or skipped pages requeued)")
+            else:
+                # Incremental runs keep the near-duplicate representatives: an unchanged page must not
+                # become "new" just because another copy of it finished first this time
+                frontier.reset(keep_duplicates=incremental)
+            index = None
+            if incremental:
+                index = IncrementalCrawlIndex(os.path.join(locationPath, "page_index.sqlite"))
+                if not resume:
+                    index.begin_run()
+            seeder = SitemapSeeder(self.session, timeout=(self.connect_timeout, self.read_timeout),
+                                   respect_robots=respect_robots)
+            seeder.load_robots(start_url)
+            delay = seeder.crawl_delay()
+            if delay:
+                self.rate_limiter.cap_rate(canonical_netloc(start_url), 1.0 / delay)
+                print(f"🐢 robots.txt Crawl-delay: {delay}s between requests")
+            if use_sitemaps and not resume:
+                print(f"🗺️ Seeded {seeder.seed(frontier, start_url, scheduler=self.scheduler)} URLs from sitemaps")
+            crawler = AsyncCrawler(self, max_concurrency=max_concurrency, per_host_concurrency=per_host_concurrency,
+                                   frontier=frontier, incremental_index=index, robots=seeder,
+                                   scheduler=self.scheduler, **crawler_options)
+            try:
+                print(f"🕸️ Crawl finished: {crawler.crawl(start_url, locationPath)}")
+            finally:
+                frontier.close()
+                if index is not None:
+                    print(f"⏩ {len(index.unchanged_urls())} pages unchanged since the last run.")
+                    index.close()
+        elif mode == "recursive":
+            if resume or incremental:
+                raise ValueError("Resuming and incremental crawls are only supported in async and rendered mode.")
+            base_domain = canonical_netloc(start_url)
+            visited = set()
+            self.duplicate_detector = DuplicateDetector(self.duplicate_distance)
+            self.scheduler.start()
+            # One browser for the whole crawl instead of one Chromium start per page
+            with ScreenshotBrowser(viewport=crawler_options.get("viewport", (1280, 800)),
+                                   full_page=crawler_options.get("full_page", True),
+                                   max_height=crawler_options.get("max_screenshot_height", 10000)) as self.screenshot_browser:
+                self.scrape_site_recursive(start_url, base_domain, visited,locationPath= locationPath)
+            self.screenshot_browser = None
+        else:
+            raise ValueError(f"Unknown scraping mode: {mode}")
+        print(f"📦 Page store: {self.page_store.stats()}")
+        if self.keep_html_files:
+            scraped_files = self.list_scraped_files()
+            print(f"Scraped {len(scraped_files)} pages. Files are in '{self.output_dir}/'.")